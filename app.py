@@ -3,16 +3,39 @@
 # ----------------------------------------------------------------------------#
 
 import json
+import hashlib
+import os
+import base64
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
+import babel.dates
+import click
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, \
+    make_response, session, stream_with_context
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.dialects import postgresql
 import logging
+import signal
+import threading
 from logging import Formatter, FileHandler
 from forms import *
 from flask_migrate import Migrate
-from datetime import datetime
+from assets import Assets, build_assets
+from compression import Compress
+from cache import FragmentCacheExtension, MemoryBackend, ResponseCache
+from database import RoutingSQLAlchemy
+from images import ImageProxy
+from jobs import JobQueue
+from metrics import RequestMetrics
+from explain import check_route_indexes
+from importer import import_file
+import benchmark
+from datetime import datetime, timedelta
+from werkzeug.http import is_resource_modified
+from functools import lru_cache
+from itertools import groupby
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -21,14 +44,49 @@ from datetime import datetime
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+response_cache = ResponseCache(app)
+app.jinja_env.add_extension(FragmentCacheExtension)
+if app.config['FRAGMENT_CACHE_ENABLED']:
+    app.jinja_env.fragment_cache = MemoryBackend(max_entries=app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+                                                 default_timeout=0)
+if app.config['JINJA_BYTECODE_CACHE_DIR']:
+    os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+request_metrics = RequestMetrics(app)
+assets = Assets(app)
+compress = Compress(app)
 
 
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('venues.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('artists.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
+
+class Genre(db.Model):
+    __tablename__ = 'genres'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+
+    def __repr__(self):
+        return f'<Genre Id: {self.id}, name: {self.name}>'
+
+
 class Venue(db.Model):
     __tablename__ = 'venues'
     id = db.Column(db.Integer, primary_key=True)
@@ -37,7 +95,6 @@ class Venue(db.Model):
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500), nullable=True)
     facebook_link = db.Column(db.String(120), nullable=True)
     website = db.Column(db.String(120), nullable=True)
@@ -45,7 +102,19 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String(500), nullable=True)
     insert_date = db.Column(db.DateTime, nullable=False, default=datetime.now())
     update_date = db.Column(db.DateTime, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    genres = db.relationship("Genre", secondary=venue_genres, order_by="Genre.name")
     shows = db.relationship("Show", backref="venue", lazy='dynamic')
+    __table_args__ = (
+        db.Index('ix_venues_name_tsv', db.func.to_tsvector('simple', name), postgresql_using='gin'),
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_venues_state_trgm', 'state', postgresql_using='gin', postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('ix_venues_insert_date', insert_date.desc()),
+        db.Index('ix_venues_state_city', 'state', 'city'),
+        db.Index('ix_venues_name_prefix', db.func.lower(name).collate('C')),
+        db.Index('ix_venues_deleted_at', deleted_at, postgresql_where=deleted_at.isnot(None)),
+    )
 
     def __repr__(self):
         return f'<Venue Id: {self.id}, name: {self.name}>'
@@ -58,7 +127,6 @@ class Artist(db.Model):
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500), nullable=True)
     facebook_link = db.Column(db.String(120), nullable=True)
     website = db.Column(db.String(120), nullable=True)
@@ -66,33 +134,259 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(500), nullable=True)
     insert_date = db.Column(db.DateTime, nullable=False, default=datetime.now())
     update_date = db.Column(db.DateTime, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True)
     available_from = db.Column(db.Time, nullable=False, default=time().min)
     available_to = db.Column(db.Time, nullable=False, default=time().max)
+    genres = db.relationship("Genre", secondary=artist_genres, order_by="Genre.name")
     shows = db.relationship("Show", backref="artist", lazy='dynamic')
+    __table_args__ = (
+        db.Index('ix_artists_name_tsv', db.func.to_tsvector('simple', name), postgresql_using='gin'),
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_artists_state_trgm', 'state', postgresql_using='gin', postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('ix_artists_insert_date', insert_date.desc()),
+        db.Index('ix_artists_name_id', 'name', 'id'),
+        db.Index('ix_artists_name_prefix', db.func.lower(name).collate('C')),
+        db.Index('ix_artists_state_city_lower', 'state', db.func.lower(city)),
+        db.Index('ix_artists_deleted_at', deleted_at, postgresql_where=deleted_at.isnot(None)),
+    )
 
     def __repr__(self):
         return f'<Artist Id: {self.id}, name: {self.name}>'
 
 
+MINUTE = db.literal_column("interval '1 minute'", db.Interval)
+
+
+def show_period(start_time, duration):
+    # the time range a show occupies; queries build it exactly like the
+    # exclusion constraints so they are answered from their GiST indexes
+    return db.func.tsrange(start_time, start_time + MINUTE * duration)
+
+
 class Show(db.Model):
     __tablename__ = "shows"
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey("venues.id"), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey("artists.id"), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration = db.Column(db.Integer, nullable=False, default=120, server_default='120')  # minutes
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        postgresql.ExcludeConstraint(('venue_id', '='), (show_period(start_time, duration), '&&'),
+                                     name='ex_shows_venue_id_period', using='gist'),
+        postgresql.ExcludeConstraint(('artist_id', '='), (show_period(start_time, duration), '&&'),
+                                     name='ex_shows_artist_id_period', using='gist'),
+    )
+
+    @property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.duration)
+
+
+class VenueStats(db.Model):
+    __tablename__ = 'venue_stats'
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime, nullable=True, index=True)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+
+class ArtistStats(db.Model):
+    __tablename__ = 'artist_stats'
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True)
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime, nullable=True, index=True)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+
+SHOW_STATS = {Venue: VenueStats, Artist: ArtistStats}
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # queued, running or failed; done jobs are deleted
+    attempts = db.Column(db.Integer, nullable=False)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.Index('ix_jobs_queued_run_at', 'run_at', 'id', postgresql_where=status == 'queued'),
+        db.Index('ix_jobs_running_started_at', 'started_at', postgresql_where=status == 'running'),
+    )
+
+    def __repr__(self):
+        return f'<Job Id: {self.id}, name: {self.name}, status: {self.status}>'
+
+
+jobs = JobQueue(app, db, Job, metrics=request_metrics)
+
+
+# ----------------------------------------------------------------------------#
+# Show statistics.
+# ----------------------------------------------------------------------------#
+
+# recomputes the counts of every entity (full) or only of those whose next
+# show has started since the last refresh, rolling it from upcoming to past.
+# Shows of a soft deleted counterpart stay until they are purged but no longer count.
+REFRESH_STATS_SQL = """
+    INSERT INTO {entity}_stats ({entity}_id, past_shows_count, upcoming_shows_count, next_show_time, refreshed_at)
+    SELECT {entity}s.id,
+           count(shows.id) FILTER (WHERE shows.start_time <= :now),
+           count(shows.id) FILTER (WHERE shows.start_time > :now),
+           min(shows.start_time) FILTER (WHERE shows.start_time > :now),
+           :now
+    FROM {entity}s
+    LEFT OUTER JOIN shows ON shows.{entity}_id = {entity}s.id
+                          AND NOT EXISTS (SELECT 1 FROM {counterpart}s
+                                          WHERE {counterpart}s.id = shows.{counterpart}_id
+                                            AND {counterpart}s.deleted_at IS NOT NULL)
+    WHERE {where}
+    GROUP BY {entity}s.id
+    ON CONFLICT ({entity}_id) DO UPDATE SET
+        past_shows_count = excluded.past_shows_count,
+        upcoming_shows_count = excluded.upcoming_shows_count,
+        next_show_time = excluded.next_show_time,
+        refreshed_at = excluded.refreshed_at
+"""
+
+
+def refresh_show_stats(full=False):
+    now = datetime.now()
+    updated = 0
+    for entity, counterpart in (('venue', 'artist'), ('artist', 'venue')):
+        where = f':full OR {entity}s.id IN (SELECT {entity}_id FROM {entity}_stats WHERE next_show_time <= :now)'
+        result = db.session.execute(REFRESH_STATS_SQL.format(entity=entity, counterpart=counterpart, where=where),
+                                    {'now': now, 'full': full})
+        updated += result.rowcount
+    db.session.commit()
+    return updated
+
+
+def recount_show_stats(model, entity_ids):
+    # recomputes the counts of the given venues or artists in the current
+    # transaction
+    if len(entity_ids) == 0:
+        return
+    entity = model.__name__.lower()
+    counterpart = 'artist' if model is Venue else 'venue'
+    statement = db.text(REFRESH_STATS_SQL.format(entity=entity, counterpart=counterpart,
+                                                 where=f'{entity}s.id IN :ids')) \
+        .bindparams(db.bindparam('ids', expanding=True))
+    db.session.execute(statement, {'now': datetime.now(), 'ids': list(entity_ids)})
+
+
+@jobs.job('recount-show-stats')
+def recount_show_stats_job(venue_ids=(), artist_ids=()):
+    # enqueued with every new show, so that the request does not wait on (and
+    # lock) the stats rows of its venue and artist
+    recount_show_stats(Venue, set(venue_ids))
+    recount_show_stats(Artist, set(artist_ids))
+    db.session.commit()
+    response_cache.invalidate('venues', 'artists', *(f'venue:{venue_id}' for venue_id in venue_ids),
+                              *(f'artist:{artist_id}' for artist_id in artist_ids))
+
+
+# any key no other advisory lock of the app uses
+PURGE_LOCK_KEY = 7280145
+
+
+def lock_purge():
+    # two purges deleting the same shows in their own order could deadlock;
+    # every purge transaction waits for the other purge's current one instead
+    db.session.execute(db.text('SELECT pg_advisory_xact_lock(:key)'), {'key': PURGE_LOCK_KEY})
+
+
+def purge_deleted(batch_size=500, echo=print):
+    # removes the soft deleted venues and artists for good: first their shows,
+    # a batch per transaction so that no lock on shows is held for long, then
+    # their genres and the venue or artist itself. The counts of the other
+    # side of every deleted show are recounted with each batch.
+    purged = 0
+    for model, counterpart, genres_table in ((Venue, Artist, venue_genres), (Artist, Venue, artist_genres)):
+        key = getattr(Show, model.__name__.lower() + '_id')
+        counterpart_key = getattr(Show, counterpart.__name__.lower() + '_id')
+        deleted = model.deleted_at.isnot(None)
+        entity_ids = [row.id for row in db.session.query(model.id).filter(deleted).order_by(model.deleted_at)]
+        for entity_id in entity_ids:
+            shows = 0
+            while True:
+                # joined to the entity, so a venue or artist restored meanwhile
+                # keeps its remaining shows
+                lock_purge()
+                batch = db.session.query(Show.id, counterpart_key) \
+                    .join(model, model.id == key) \
+                    .filter(model.id == entity_id, deleted) \
+                    .limit(batch_size) \
+                    .all()
+                if len(batch) == 0:
+                    break
+                db.session.query(Show).filter(Show.id.in_([show_id for show_id, _ in batch])) \
+                    .delete(synchronize_session=False)
+                recount_show_stats(counterpart, {counterpart_id for _, counterpart_id in batch})
+                db.session.commit()
+                shows += len(batch)
+            lock_purge()
+            db.session.execute(genres_table.delete().where(db.and_(
+                genres_table.c[key.key] == entity_id,
+                db.exists().where(db.and_(model.id == entity_id, deleted))
+            )))
+            if db.session.query(model).filter(model.id == entity_id, deleted).delete(synchronize_session=False):
+                purged += 1
+                echo(f'Purged {model.__name__.lower()} {entity_id} and {shows} shows.')
+            db.session.commit()
+    return purged
+
+
+@jobs.job('purge-deleted')
+def purge_deleted_job():
+    if purge_deleted(app.config['PURGE_BATCH_SIZE']) > 0:
+        response_cache.invalidate('venues', 'artists', 'shows')
 
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+BABEL_DATETIME_FORMATS = ('full', 'long', 'medium', 'short')
+
+
+def format_datetime(value, format='medium', locale=None):
+    return format_datetime_value(value, format, locale or babel.dates.LC_TIME)
+
+
+# memoized per value: the same start times repeat across the rows of a page
+# and between requests
+@lru_cache(maxsize=4096)
+def format_datetime_value(value, format, locale):
+    date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=babel.dates.UTC)
+    if format in BABEL_DATETIME_FORMATS and format not in DATETIME_FORMATS:
+        # the locale's own formats join a date and a time format, Babel does that
+        return babel.dates.format_datetime(date, format, locale=locale)
+    pattern, locale = get_datetime_pattern(format, locale)
+    return pattern.apply(date, locale)
+
+
+@lru_cache(maxsize=None)
+def get_datetime_pattern(format, locale):
+    # explicit patterns only, named formats are formatted by Babel
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -103,6 +397,7 @@ app.jinja_env.filters['datetime'] = format_datetime
 # ----------------------------------------------------------------------------#
 
 @app.route('/')
+@response_cache.cached('venues', 'artists')
 def index():
     return render_template('pages/home.html', data=get_latest())
 
@@ -111,86 +406,45 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@response_cache.cached('venues', 'shows')
 def venues():
-    all_venues = Venue.query.all()
-    cities = set([v.city for v in all_venues])
-    states = set([v.state for v in all_venues])
-    data = []
-
-    for state in states:
-        for city in cities:
-            filtered_venues = [v for v in all_venues if v.city == city and v.state == state]
-            if len(filtered_venues) > 0:
-                data.append(
-                    {
-                        "city": city,
-                        "state": state,
-                        "venues": sorted(
-                            [
-                                {
-                                    "id": v.id,
-                                    "name": v.name,
-                                    "num_upcoming_shows": v.shows.filter(Show.start_time > datetime.now()).count()
-                                }
-                                for v in filtered_venues
-                            ], key=lambda x: x['name']
-                        )
-                    }
-                )
-    return render_template('pages/venues.html', areas=sorted(data, key=lambda x: (x['state'], x['city'])))
+    return render_page('pages/venues.html', areas=get_venue_areas())
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-    venues = None
     search_term = request.form.get('search_term', '')
-
-    if search_term.find(',') > -1:
-        venues = Venue.query.filter(
-            Venue.city.ilike(f"%{search_term.split(',')[0].strip()}%"),
-            Venue.state.ilike(f"%{search_term.split(',')[1].strip()}%")
-        ).all()
-
-    if venues is None:
-        venues_by_name = Venue.query.filter(Venue.name.ilike(f"%{search_term}%")).all()
-        if len(venues_by_name) > 0:
-            venues = venues_by_name
-        else:
-            venues_by_city = Venue.query.filter(Venue.city.ilike(f"%{search_term}%")).all()
-            if len(venues_by_city) > 0:
-                venues = venues_by_city
-            else:
-                venues_by_state = Venue.query.filter(Venue.state.ilike(f"%{search_term}%")).all()
-                if len(venues_by_state) > 0:
-                    venues = venues_by_state
-
+    venues = search_entities(Venue, search_term)
     response = {
-        "count": len(venues) if venues is not None else 0,
-        "data": sorted(
-            [
-                {
-                    "id": v.id,
-                    "name": v.name,
-                    "num_upcoming_shows": v.shows.filter(Show.start_time > datetime.now()).count()
-                }
-                for v in venues
-            ], key=lambda x: x['name']
-        ) if venues is not None else []
+        "count": len(venues),
+        "data": venues
     }
     return render_template('pages/search_venues.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
+@app.route('/venues/autocomplete')
+def autocomplete_venues():
+    return jsonify(autocomplete(Venue, request.args.get('q', '')))
+
+
 @app.route('/venues/<int:venue_id>')
+@response_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    venue = Venue.query.get(venue_id)
+    etag = get_page_etag(Venue, venue_id, Artist)
+    if etag is None:
+        return abort(404)
+    if not is_resource_modified(request.environ, etag):
+        return set_etag(Response(status=304), etag)
+    venue, past_shows, upcoming_shows = get_entity_shows(Venue, venue_id, Artist)
     if venue is None:
         return abort(404)
+    response_cache.tag(*(f"artist:{show['artist_id']}" for show in past_shows + upcoming_shows))
     data = {
         "id": venue.id,
         "name": venue.name,
-        "genres": venue.genres.split(','),
+        "genres": [genre.name for genre in venue.genres],
         "address": venue.address,
         "city": venue.city,
         "state": venue.state,
@@ -200,30 +454,12 @@ def show_venue(venue_id):
         "seeking_talent": venue.seeking_talent,
         "seeking_description": venue.seeking_description,
         "image_link": venue.image_link,
-        "past_shows":
-            [
-                {
-                    "artist_id": show.artist_id,
-                    "artist_name": show.artist.name,
-                    "artist_image_link": show.artist.image_link,
-                    "start_time": show.start_time
-                }
-                for show in venue.shows.filter(Show.start_time <= datetime.now()).all()
-            ],
-        "upcoming_shows":
-            [
-                {
-                    "artist_id": show.artist_id,
-                    "artist_name": show.artist.name,
-                    "artist_image_link": show.artist.image_link,
-                    "start_time": show.start_time
-                }
-                for show in venue.shows.filter(Show.start_time > datetime.now()).all()
-            ],
-        "past_shows_count": venue.shows.filter(Show.start_time <= datetime.now()).count(),
-        "upcoming_shows_count": venue.shows.filter(Show.start_time > datetime.now()).count()
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
     }
-    return render_template('pages/show_venue.html', venue=data)
+    return set_etag(make_response(render_template('pages/show_venue.html', venue=data)), etag)
 
 
 #  Create Venue
@@ -249,7 +485,7 @@ def create_venue_submission():
             seeking_talent=form.seeking_talent.data,
             image_link=form.image_link.data,
             facebook_link=form.facebook_link.data,
-            genres=','.join(form.genres.data),
+            genres=get_genres(form.genres.data),
             phone=form.phone.data,
             website=form.website.data,
             seeking_description=form.seeking_description.data if form.seeking_talent.data else '',
@@ -258,21 +494,35 @@ def create_venue_submission():
         )
         db.session.add(venue)
         db.session.commit()
+        response_cache.invalidate('venues')
         flash('Venue ' + form.name.data + ' was successfully listed!')
     except Exception as e:
-        flash('An error occurred. Venue ' + form.name.data + ' could not be listed.')
+        db.session.rollback()
+        if is_pending_purge(Venue, form.name.data):
+            flash('Venue ' + form.name.data + ' was deleted and not purged yet; its name is taken until then.')
+        else:
+            flash('An error occurred. Venue ' + form.name.data + ' could not be listed.')
     return render_template('pages/home.html', data=get_latest())
 
 
 @app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
+    # soft delete: the venue disappears from every page right away, and a
+    # background job removes it and its shows later, in small batches
     try:
-        venue = Venue().query.get(venue_id)
+        venue = get_entity(Venue, venue_id)
         if venue is not None:
-            db.session.delete(venue)
+            venue.deleted_at = venue.update_date = datetime.now()
+            # the artists it had shows with no longer count them
+            artist_ids = [row[0] for row in
+                          db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+            jobs.enqueue('recount-show-stats', artist_ids=artist_ids)
+            jobs.enqueue('purge-deleted', unique=True)
             db.session.commit()
+            response_cache.invalidate('venues', 'shows', f'venue:{venue_id}')
             flash('Venue was successfully deleted!')
     except Exception as e:
+        db.session.rollback()
         flash('An error occurred. Venue could not be deleted.')
         return abort(500)
     return render_template("pages/home.html", data=get_latest())
@@ -281,65 +531,80 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@response_cache.cached('artists')
 def artists():
-    artists = Artist.query.all()
+    query = db.session.query(Artist.id, Artist.name).filter(not_deleted(Artist))
+    artists, pager = paginate(query, Artist.name, Artist.id)
     data = [{'id': artist.id, 'name': artist.name} for artist in artists]
-    return render_template('pages/artists.html', artists=sorted(data, key=lambda x: x['name']))
+    return render_page('pages/artists.html', artists=data, pager=pager)
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    artists = None
     search_term = request.form.get('search_term', '')
-
-    if search_term.find(',') > -1:
-        artists = Artist.query.filter(
-            Artist.city.ilike(f"%{search_term.split(',')[0].strip()}%"),
-            Artist.state.ilike(f"%{search_term.split(',')[1].strip()}%")
-        ).all()
-
-    if artists is None:
-        artists_by_name = Artist.query.filter(Artist.name.ilike(f"%{search_term}%")).all()
-        if len(artists_by_name) > 0:
-            artists = artists_by_name
-        else:
-            artists_by_city = Artist.query.filter(Artist.city.ilike(f"%{search_term}%")).all()
-            if len(artists_by_city) > 0:
-                artists = artists_by_city
-            else:
-                artists_by_state = Artist.query.filter(Artist.state.ilike(f"%{search_term}%")).all()
-                if len(artists_by_state) > 0:
-                    artists = artists_by_state
-
+    artists = search_entities(Artist, search_term)
     response = {
-        "count": len(artists) if artists is not None else 0,
-        "data": sorted(
-            [
-                {
-                    "id": a.id,
-                    "name": a.name,
-                    'num_upcoming_shows': a.shows.filter(Show.start_time > datetime.now()).count()
-                }
-                for a in artists
-            ], key=lambda x: x["name"]
-        ) if artists is not None else []
-
+        "count": len(artists),
+        "data": artists
     }
     return render_template('pages/search_artists.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
+@app.route('/artists/available')
+def available_artists():
+    # e.g. /artists/available?start_time=2026-10-23 21:00&city=San Francisco&state=CA&genre=Jazz
+    try:
+        start_time = datetime.fromisoformat(request.args.get('start_time', ''))
+        duration = int(request.args.get('duration', 120))
+    except ValueError:
+        return api_error(400, 'start_time must be given as YYYY-MM-DD HH:MM and duration in minutes')
+    # as in the show form; a show has to end after it starts
+    if not 1 <= duration <= 24 * 60:
+        return api_error(400, 'duration must be between 1 and 1440 minutes')
+    query = get_available_artists_query(start_time, duration, request.args.get('city'),
+                                        request.args.get('state'), request.args.get('genre'))
+    artists, pager = paginate(query, Artist.name, Artist.id)
+    return app.response_class(json.dumps({
+        'data': [
+            {
+                'id': artist.id,
+                'name': artist.name,
+                'city': artist.city,
+                'state': artist.state,
+                'available_from': artist.available_from,
+                'available_to': artist.available_to
+            }
+            for artist in artists
+        ],
+        'prev': pager['prev'],
+        'next': pager['next']
+    }, default=json_default), mimetype='application/json')
+
+
+@app.route('/artists/autocomplete')
+def autocomplete_artists():
+    return jsonify(autocomplete(Artist, request.args.get('q', '')))
+
+
 @app.route('/artists/<int:artist_id>')
+@response_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+    etag = get_page_etag(Artist, artist_id, Venue)
+    if etag is None:
+        return abort(404)
+    if not is_resource_modified(request.environ, etag):
+        return set_etag(Response(status=304), etag)
+    artist, past_shows, upcoming_shows = get_entity_shows(Artist, artist_id, Venue)
     if artist is None:
         return abort(404)
+    response_cache.tag(*(f"venue:{show['venue_id']}" for show in past_shows + upcoming_shows))
     data = {
         "id": artist.id,
         "name": artist.name,
-        "genres": artist.genres.split(','),
+        "genres": [genre.name for genre in artist.genres],
         "city": artist.city,
         "state": artist.state,
         "phone": artist.phone,
@@ -350,42 +615,33 @@ def show_artist(artist_id):
         "image_link": artist.image_link,
         "available_from": artist.available_from,
         "available_to": artist.available_to,
-        "past_shows":
-            [
-                {
-                    "venue_id": show.venue_id,
-                    "venue_name": show.venue.name,
-                    "venue_image_link": show.venue.image_link,
-                    "start_time": show.start_time
-                }
-                for show in artist.shows.filter(Show.start_time <= datetime.now()).all()
-            ],
-        "upcoming_shows":
-            [
-                {
-                    "venue_id": show.venue_id,
-                    "venue_name": show.venue.name,
-                    "venue_image_link": show.venue.image_link,
-                    "start_time": show.start_time
-                }
-                for show in artist.shows.filter(Show.start_time > datetime.now()).all()
-            ],
-        "past_shows_count": artist.shows.filter(Show.start_time <= datetime.now()).count(),
-        "upcoming_shows_count": artist.shows.filter(Show.start_time > datetime.now()).count()
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
     }
-    return render_template('pages/show_artist.html', artist=data)
+    return set_etag(make_response(render_template('pages/show_artist.html', artist=data)), etag)
 
 
 @app.route('/artists/<int:artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
+    # soft delete: the artist disappears from every page right away, and a
+    # background job removes it and its shows later, in small batches
     try:
-        artist = Artist().query.get(artist_id)
+        artist = get_entity(Artist, artist_id)
         if artist is not None:
-            db.session.delete(artist)
+            artist.deleted_at = artist.update_date = datetime.now()
+            # the venues it had shows with no longer count them
+            venue_ids = [row[0] for row in
+                         db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()]
+            jobs.enqueue('recount-show-stats', venue_ids=venue_ids)
+            jobs.enqueue('purge-deleted', unique=True)
             db.session.commit()
-            flash('Venue was successfully deleted!')
+            response_cache.invalidate('artists', 'shows', f'artist:{artist_id}')
+            flash('Artist was successfully deleted!')
     except Exception as e:
-        flash('An error occurred. Venue could not be deleted.')
+        db.session.rollback()
+        flash('An error occurred. Artist could not be deleted.')
         return abort(500)
     return render_template("pages/home.html", data=get_latest())
 
@@ -395,13 +651,13 @@ def delete_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     form = ArtistForm()
-    artist = Artist.query.get(artist_id)
+    artist = get_entity(Artist, artist_id)
     if artist is None:
         return redirect(url_for('create_artist_form'))
     form.name.data = artist.name
     form.city.data = artist.city
     form.state.data = artist.state
-    form.genres.data = artist.genres.split(',')
+    form.genres.data = [genre.name for genre in artist.genres]
     form.phone.data = artist.phone
     form.facebook_link.data = artist.facebook_link
     form.image_link.data = artist.image_link
@@ -416,39 +672,48 @@ def edit_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     form = ArtistForm()
-    artist = Artist.query.get(artist_id)
+    artist = get_entity(Artist, artist_id)
     form_is_valid = form.validate_on_submit()
     if not form_is_valid:
         return render_template('forms/edit_artist.html', form=form, artist=artist)
     if artist is None:
         return abort(500)
-    artist.name = form.name.data
-    artist.city = form.city.data
-    artist.state = form.state.data
-    artist.genres = ','.join(form.genres.data)
-    artist.phone = form.phone.data
-    artist.facebook_link = form.facebook_link.data
-    artist.image_link = form.image_link.data
-    artist.website = form.website.data
-    artist.seeking_venue = form.seeking_venue.data
-    artist.seeking_description = form.seeking_description.data
-    artist.available_from = form.available_from.data
-    artist.available_to = form.available_to.data
-    artist.update_date = datetime.now()
-    db.session.commit()
+    try:
+        artist.name = form.name.data
+        artist.city = form.city.data
+        artist.state = form.state.data
+        artist.genres = get_genres(form.genres.data)
+        artist.phone = form.phone.data
+        artist.facebook_link = form.facebook_link.data
+        artist.image_link = form.image_link.data
+        artist.website = form.website.data
+        artist.seeking_venue = form.seeking_venue.data
+        artist.seeking_description = form.seeking_description.data
+        artist.available_from = form.available_from.data
+        artist.available_to = form.available_to.data
+        artist.update_date = datetime.now()
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        if is_pending_purge(Artist, form.name.data):
+            flash('Artist ' + form.name.data + ' was deleted and not purged yet; its name is taken until then.')
+        else:
+            flash('An error occurred. Artist ' + form.name.data + ' could not be updated.')
+        return render_template('forms/edit_artist.html', form=form, artist=artist)
+    response_cache.invalidate('artists', f'artist:{artist_id}')
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     form = VenueForm()
-    venue = Venue.query.get(venue_id)
+    venue = get_entity(Venue, venue_id)
     if venue is None:
         return redirect(url_for('create_venue_form'))
     form.name.data = venue.name
     form.city.data = venue.city
     form.state.data = venue.state
-    form.genres.data = venue.genres.split(',')
+    form.genres.data = [genre.name for genre in venue.genres]
     form.phone.data = venue.phone
     form.facebook_link.data = venue.facebook_link
     form.image_link.data = venue.image_link
@@ -462,25 +727,34 @@ def edit_venue(venue_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     form = VenueForm()
-    venue = Venue.query.get(venue_id)
+    venue = get_entity(Venue, venue_id)
     form_is_valid = form.validate_on_submit()
     if not form_is_valid:
         return render_template('forms/edit_venue.html', form=form, venue=venue)
     if venue is None:
         return abort(500)
-    venue.name = form.name.data
-    venue.city = form.city.data
-    venue.state = form.state.data
-    venue.genres = ','.join(form.genres.data)
-    venue.phone = form.phone.data
-    venue.facebook_link = form.facebook_link.data
-    venue.image_link = form.image_link.data
-    venue.website = form.website.data
-    venue.seeking_talent = form.seeking_talent.data
-    venue.seeking_description = form.seeking_description.data
-    venue.address = form.address.data
-    venue.update_date = datetime.now()
-    db.session.commit()
+    try:
+        venue.name = form.name.data
+        venue.city = form.city.data
+        venue.state = form.state.data
+        venue.genres = get_genres(form.genres.data)
+        venue.phone = form.phone.data
+        venue.facebook_link = form.facebook_link.data
+        venue.image_link = form.image_link.data
+        venue.website = form.website.data
+        venue.seeking_talent = form.seeking_talent.data
+        venue.seeking_description = form.seeking_description.data
+        venue.address = form.address.data
+        venue.update_date = datetime.now()
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        if is_pending_purge(Venue, form.name.data):
+            flash('Venue ' + form.name.data + ' was deleted and not purged yet; its name is taken until then.')
+        else:
+            flash('An error occurred. Venue ' + form.name.data + ' could not be updated.')
+        return render_template('forms/edit_venue.html', form=form, venue=venue)
+    response_cache.invalidate('venues', f'venue:{venue_id}')
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 
@@ -507,7 +781,7 @@ def create_artist_submission():
             seeking_venue=form.seeking_venue.data,
             image_link=form.image_link.data,
             facebook_link=form.facebook_link.data,
-            genres=','.join(form.genres.data),
+            genres=get_genres(form.genres.data),
             phone=form.phone.data,
             website=form.website.data,
             seeking_description=form.seeking_description.data,
@@ -517,9 +791,14 @@ def create_artist_submission():
         )
         db.session.add(artist)
         db.session.commit()
+        response_cache.invalidate('artists')
         flash('Artist ' + form.name.data + ' was successfully listed!')
     except:
-        flash('An error occurred. Artist ' + form.name.data + ' could not be listed.')
+        db.session.rollback()
+        if is_pending_purge(Artist, form.name.data):
+            flash('Artist ' + form.name.data + ' was deleted and not purged yet; its name is taken until then.')
+        else:
+            flash('An error occurred. Artist ' + form.name.data + ' could not be listed.')
 
     return render_template('pages/home.html', data=get_latest())
 
@@ -528,20 +807,10 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@response_cache.cached('shows', 'venues', 'artists')
 def shows():
-    shows = Show.query.all()
-    data = sorted([
-        {
-            "venue_id": s.venue_id,
-            "venue_name": s.venue.name,
-            "artist_id": s.artist_id,
-            "artist_name": s.artist.name,
-            "artist_image_link": s.artist.image_link,
-            "start_time": s.start_time
-        }
-        for s in shows
-    ], key=lambda x: x["start_time"], reverse=True)
-    return render_template('pages/shows.html', shows=data)
+    shows, pager = paginate(get_shows_query(), Show.start_time, Show.id, descending=True)
+    return render_page('pages/shows.html', shows=[get_show_data(s) for s in shows], pager=pager)
 
 
 @app.route('/shows/create')
@@ -562,14 +831,111 @@ def create_show_submission():
         show.venue_id = int(form.venue_id.data)
         show.artist_id = int(form.artist_id.data)
         show.start_time = form.start_time.data
+        show.duration = form.duration.data
+        remove_deleted_conflicts(show.venue_id, show.artist_id, show.start_time, show.duration)
         db.session.add(show)
+        jobs.enqueue('recount-show-stats', venue_ids=[show.venue_id], artist_ids=[show.artist_id])
         db.session.commit()
+        response_cache.invalidate('shows', f'venue:{show.venue_id}', f'artist:{show.artist_id}')
         flash('Show was successfully listed!')
-    except:
+    except IntegrityError as e:
+        # a concurrent booking got in between the validation and the insert
+        db.session.rollback()
+        constraint = getattr(getattr(e.orig, 'diag', None), 'constraint_name', None)
+        if constraint not in SHOW_CONFLICTS:
+            raise
+        form.start_time.errors.append(SHOW_CONFLICTS[constraint])
+        return render_template('forms/new_show.html', form=form)
+    except SQLAlchemyError:
+        db.session.rollback()
         flash('An error occurred. Show could not be listed.')
     return render_template('pages/home.html', data=get_latest())
 
 
+@app.route('/venues/<int:venue_id>/free-slots')
+def venue_free_slots(venue_id):
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d')
+    except ValueError:
+        return api_error(400, 'date must be given as YYYY-MM-DD')
+    if get_entity(Venue, venue_id) is None:
+        return api_error(404, 'Not found')
+    slots = get_free_slots(Show.venue_id, venue_id, day, day + timedelta(days=1))
+    return jsonify([{'start_time': start.isoformat(), 'end_time': end.isoformat()} for start, end in slots])
+
+
+#  Genres
+#  ----------------------------------------------------------------
+
+@app.route('/genres/<genre>/venues')
+@response_cache.cached('venues', 'shows')
+def genre_venues(genre):
+    return render_page('pages/venues.html', areas=get_venue_areas(genre))
+
+
+@app.route('/genres/<genre>/artists')
+@response_cache.cached('artists')
+def genre_artists(genre):
+    query = db.session.query(Artist.id, Artist.name) \
+        .join(artist_genres) \
+        .join(Genre) \
+        .filter(Genre.name == genre, not_deleted(Artist))
+    artists, pager = paginate(query, Artist.name, Artist.id)
+    data = [{'id': artist.id, 'name': artist.name} for artist in artists]
+    return render_page('pages/artists.html', artists=data, pager=pager)
+
+
+@app.route('/genres/<genre>/shows')
+@response_cache.cached('shows', 'venues', 'artists')
+def genre_shows(genre):
+    # upcoming shows of artists playing the given genre
+    query = get_shows_query() \
+        .join(artist_genres, artist_genres.c.artist_id == Show.artist_id) \
+        .join(Genre) \
+        .filter(Genre.name == genre, Show.start_time > datetime.now())
+    shows, pager = paginate(query, Show.start_time, Show.id)
+    return render_page('pages/shows.html', shows=[get_show_data(s) for s in shows], pager=pager)
+
+
+#  API
+#  ----------------------------------------------------------------
+
+@app.route('/api/v1/venues')
+def api_venues():
+    return api_collection(Venue, Venue.id)
+
+
+@app.route('/api/v1/venues/<int:venue_id>')
+def api_venue(venue_id):
+    return api_entity(Venue, venue_id, Artist)
+
+
+@app.route('/api/v1/artists')
+def api_artists():
+    return api_collection(Artist, Artist.id)
+
+
+@app.route('/api/v1/artists/<int:artist_id>')
+def api_artist(artist_id):
+    return api_entity(Artist, artist_id, Venue)
+
+
+@app.route('/api/v1/shows')
+def api_shows():
+    return api_collection(Show, Show.start_time, Show.id)
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    fragment_cache = app.jinja_env.fragment_cache
+    return jsonify(dict(response_cache.stats(), fragments=len(fragment_cache) if fragment_cache is not None else 0))
+
+
+@app.route('/metrics')
+def metrics():
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -580,20 +946,564 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
+def not_deleted(model):
+    # every read of venues and artists leaves out the soft deleted ones
+    return model.deleted_at.is_(None)
+
+
+def get_entity(model, entity_id):
+    return model.query.filter(model.id == entity_id, not_deleted(model)).first()
+
+
+def is_pending_purge(model, name):
+    # a deleted venue or artist keeps its name until it is purged
+    return db.session.query(model.query.filter(model.name == name, model.deleted_at.isnot(None)).exists()).scalar()
+
+
+def get_image_link(kind, entity_id):
+    model = {'venue': Venue, 'artist': Artist}.get(kind)
+    entity = get_entity(model, entity_id) if model is not None else None
+    return entity.image_link if entity is not None else None
+
+
+images = ImageProxy(app, get_image_link)
+
+
 def get_latest():
-    latest_venues = Venue.query.order_by(Venue.insert_date.desc()).limit(10).all()
-    latest_artists = Artist.query.order_by(Artist.insert_date.desc()).limit(10).all()
+    latest_venues = Venue.query.filter(not_deleted(Venue)).order_by(Venue.insert_date.desc()).limit(10).all()
+    latest_artists = Artist.query.filter(not_deleted(Artist)).order_by(Artist.insert_date.desc()).limit(10).all()
     venues = [{"id": v.id, "name": v.name} for v in latest_venues]
     artists = [{"id": a.id, "name": a.name} for a in latest_artists]
     return {'venues': venues, 'artists': artists}
 
 
+def render_page(template_name, **context):
+    # with STREAM_TEMPLATES the page is sent while it renders, so the head and
+    # its asset links reach the browser before the rows. Pages showing flashed
+    # messages are rendered in full: popping them changes the session, which
+    # is saved before a stream starts.
+    if not app.config['STREAM_TEMPLATES'] or session.get('_flashes'):
+        return render_template(template_name, **context)
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+
+def encode_cursor(value, row_id):
+    return base64.urlsafe_b64encode(json.dumps([value, row_id], default=str).encode()).decode()
+
+
+def decode_cursor(cursor, sort_column):
+    # cursors come back from the client: anything but a [value, id] pair of
+    # the sort column's type is a bad request, not a query error
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        numeric = isinstance(sort_column.type, (db.Integer, db.Numeric))
+        if isinstance(value, bool) or not isinstance(value, (int, float) if numeric else str) \
+                or isinstance(row_id, bool) or not isinstance(row_id, int) or '\x00' in str(value):
+            raise ValueError(cursor)
+        if isinstance(sort_column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        return value, row_id
+    except (ValueError, TypeError):
+        return abort(400)
+
+
+def get_cursor_arg(name):
+    # a repeated cursor parameter is as malformed as a garbled one
+    values = request.args.getlist(name)
+    if len(values) > 1:
+        return abort(400)
+    return values[0] if values else None
+
+
+def paginate(query, sort_column, id_column, descending=False):
+    # keyset pagination on (sort_column, id_column): the "after" and "before"
+    # cursors hold the key of the last/first row of the neighbouring page, so
+    # each page is a range scan of the index instead of an OFFSET
+    page_size = app.config['LISTING_PAGE_SIZE']
+    after = get_cursor_arg('after')
+    before = get_cursor_arg('before')
+    key = db.tuple_(sort_column, id_column)
+    forward_order = [sort_column.desc(), id_column.desc()] if descending else [sort_column, id_column]
+    backward_order = [sort_column, id_column] if descending else [sort_column.desc(), id_column.desc()]
+
+    if before is not None:
+        cursor = decode_cursor(before, sort_column)
+        query = query.filter(key > cursor if descending else key < cursor).order_by(*backward_order)
+    else:
+        if after is not None:
+            cursor = decode_cursor(after, sort_column)
+            query = query.filter(key < cursor if descending else key > cursor)
+        query = query.order_by(*forward_order)
+
+    rows = query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before is not None:
+        rows.reverse()
+    has_next = has_more if before is None else True
+    has_prev = has_more if before is not None else after is not None
+
+    def row_cursor(row):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
+
+    pager = {
+        "prev": row_cursor(rows[0]) if has_prev and len(rows) > 0 else None,
+        "next": row_cursor(rows[-1]) if has_next and len(rows) > 0 else None
+    }
+    return rows, pager
+
+
+def get_genres(names):
+    # new genres are inserted with ON CONFLICT DO NOTHING: two submissions
+    # adding the same genre at once both end up with the one row
+    genres = Genre.query.filter(Genre.name.in_(names)).all()
+    existing = set(genre.name for genre in genres)
+    missing = [name for name in dict.fromkeys(names) if name not in existing]
+    if len(missing) > 0:
+        db.session.execute(postgresql.insert(Genre.__table__)
+                           .values([{'name': name} for name in missing])
+                           .on_conflict_do_nothing(index_elements=['name']))
+        genres += Genre.query.filter(Genre.name.in_(missing)).all()
+    return genres
+
+
+def get_venue_areas(genre=None):
+    # one grouped query ordered by area, so the city/state groups can be built
+    # in a single pass over the rows while the template renders them
+    num_upcoming_shows = db.func.coalesce(VenueStats.upcoming_shows_count, 0).label('num_upcoming_shows')
+    rows = db.session.query(Venue.state, Venue.city, Venue.id, Venue.name, Venue.update_date, num_upcoming_shows) \
+        .outerjoin(VenueStats) \
+        .filter(not_deleted(Venue))
+    if genre is not None:
+        rows = rows.join(venue_genres).join(Genre).filter(Genre.name == genre)
+    rows = rows.order_by(Venue.state, Venue.city, Venue.name)
+    for (state, city), area_venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        yield {
+            "city": city,
+            "state": state,
+            "venues": [
+                {
+                    "id": v.id,
+                    "name": v.name,
+                    "update_date": v.update_date,
+                    "num_upcoming_shows": v.num_upcoming_shows
+                }
+                for v in area_venues
+            ]
+        }
+
+
+def get_shows_query():
+    return db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Venue.update_date.label('venue_update_date'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Artist.update_date.label('artist_update_date')
+    ) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(not_deleted(Venue), not_deleted(Artist))
+
+
+def get_show_data(show):
+    return {
+        "id": show.id,
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "venue_update_date": show.venue_update_date,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "artist_update_date": show.artist_update_date,
+        "start_time": show.start_time
+    }
+
+
+def get_entity_shows(model, entity_id, counterpart):
+    # loads a venue or an artist together with all of its shows and the other
+    # side of each show in one query, then splits them into past and upcoming
+    entity_key = model.__name__.lower()
+    counterpart_key = counterpart.__name__.lower()
+    rows = db.session.query(model, Show.start_time, counterpart.id, counterpart.name, counterpart.image_link,
+                            counterpart.update_date) \
+        .outerjoin(Show, getattr(Show, entity_key + '_id') == model.id) \
+        .outerjoin(counterpart, db.and_(counterpart.id == getattr(Show, counterpart_key + '_id'),
+                                        not_deleted(counterpart))) \
+        .filter(model.id == entity_id, not_deleted(model)) \
+        .order_by(Show.start_time) \
+        .all()
+    if len(rows) == 0:
+        return None, [], []
+    now = datetime.now()
+    past_shows = []
+    upcoming_shows = []
+    for entity, start_time, counterpart_id, counterpart_name, counterpart_image_link, counterpart_update_date in rows:
+        if start_time is None or counterpart_id is None:
+            continue
+        show = {
+            counterpart_key + "_id": counterpart_id,
+            counterpart_key + "_name": counterpart_name,
+            counterpart_key + "_image_link": counterpart_image_link,
+            counterpart_key + "_update_date": counterpart_update_date,
+            "start_time": start_time
+        }
+        if start_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    return rows[0][0], past_shows, upcoming_shows
+
+
+def get_page_etag(model, entity_id, counterpart):
+    # ETag of a venue/artist page from one aggregate over the entity, its stats
+    # row (touched whenever its counts are recomputed) and its shows, without
+    # loading them. The start of the latest past show is included because the
+    # page changes when a show moves to "past shows". There is no Last-Modified:
+    # a new or removed show changes the page but none of these dates until the
+    # stats are recounted. Returns None when the entity does not exist.
+    now = datetime.now()
+    stats = SHOW_STATS[model]
+    shows = db.session.query(
+        db.func.coalesce(model.update_date, model.insert_date),
+        stats.refreshed_at,
+        db.func.max(db.func.coalesce(counterpart.update_date, counterpart.insert_date)),
+        db.func.max(Show.start_time).filter(Show.start_time <= now),
+        db.func.count(Show.id),
+        db.func.max(Show.id)
+    ) \
+        .select_from(model) \
+        .outerjoin(stats) \
+        .outerjoin(Show, getattr(Show, model.__name__.lower() + '_id') == model.id) \
+        .outerjoin(counterpart, counterpart.id == getattr(Show, counterpart.__name__.lower() + '_id')) \
+        .filter(model.id == entity_id, not_deleted(model)) \
+        .group_by(model.id, stats.refreshed_at) \
+        .first()
+    if shows is None:
+        return None
+    return hashlib.md5(repr((model.__tablename__, entity_id) + tuple(shows)).encode()).hexdigest()
+
+
+def set_etag(response, etag):
+    # no-cache lets browsers and the CDN store the page but revalidate it on
+    # every request, which the ETag makes a cheap 304
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def search_entities(model, search_term):
+    # "City, ST" searches by location, anything else by name, falling back to
+    # city and then state matches when no name matches. All tiers are matched
+    # in one query (backed by the pg_trgm and tsvector GIN indexes) and only the
+    # rows of the best matching tier are kept.
+    if search_term.find(',') > -1:
+        city = search_term.split(',')[0].strip()
+        state = search_term.split(',')[1].strip()
+        match = db.and_(model.city.ilike(f"%{city}%"), model.state.ilike(f"%{state}%"))
+        match_tier = db.literal(0)
+        rank = db.func.similarity(model.city, city) + db.func.similarity(model.state, state)
+    else:
+        name_document = db.func.to_tsvector('simple', model.name)
+        name_query = db.func.plainto_tsquery('simple', search_term)
+        name_match = db.or_(model.name.ilike(f"%{search_term}%"),
+                            name_document.op('@@', is_comparison=True)(name_query))
+        city_match = model.city.ilike(f"%{search_term}%")
+        state_match = model.state.ilike(f"%{search_term}%")
+        match = db.or_(name_match, city_match, state_match)
+        match_tier = db.case([(name_match, 0), (city_match, 1)], else_=2)
+        rank = db.func.ts_rank(name_document, name_query) + db.func.similarity(model.name, search_term)
+
+    stats = SHOW_STATS[model]
+    matches = db.session.query(
+        model.id,
+        model.name,
+        db.func.coalesce(stats.upcoming_shows_count, 0).label('num_upcoming_shows'),
+        match_tier.label('match_tier'),
+        db.func.min(match_tier).over().label('best_tier'),
+        rank.label('rank')
+    ) \
+        .outerjoin(stats) \
+        .filter(match, not_deleted(model)) \
+        .subquery()
+    rows = db.session.query(matches.c.id, matches.c.name, matches.c.num_upcoming_shows) \
+        .filter(matches.c.match_tier == matches.c.best_tier) \
+        .order_by(matches.c.rank.desc(), matches.c.name)
+    return [
+        {
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.num_upcoming_shows
+        }
+        for row in rows
+    ]
+
+
+def get_api_columns(model):
+    # the fields an API client can select with ?fields=, by name
+    if model is Show:
+        return {
+            'id': Show.id,
+            'start_time': Show.start_time,
+            'duration': Show.duration,
+            'venue_id': Show.venue_id,
+            'venue_name': Venue.name,
+            'artist_id': Show.artist_id,
+            'artist_name': Artist.name,
+            'artist_image_link': Artist.image_link
+        }
+    stats = SHOW_STATS[model]
+    genres_table = venue_genres if model is Venue else artist_genres
+    entity_id = genres_table.c[model.__name__.lower() + '_id']
+    columns = {column.key: getattr(model, column.key) for column in model.__table__.columns
+               if column.key not in ('insert_date', 'update_date', 'deleted_at')}
+    columns['genres'] = db.select([db.func.array_agg(postgresql.aggregate_order_by(Genre.name, Genre.name))]) \
+        .select_from(genres_table.join(Genre)) \
+        .where(entity_id == model.id) \
+        .as_scalar()
+    columns['past_shows_count'] = db.func.coalesce(stats.past_shows_count, 0)
+    columns['upcoming_shows_count'] = db.func.coalesce(stats.upcoming_shows_count, 0)
+    return columns
+
+
+def get_api_query(model, fields):
+    columns = get_api_columns(model)
+    query = db.session.query(*(columns[field].label(field) for field in fields))
+    if model is Show:
+        return query.select_from(Show) \
+            .join(Venue, Venue.id == Show.venue_id) \
+            .join(Artist, Artist.id == Show.artist_id) \
+            .filter(not_deleted(Venue), not_deleted(Artist))
+    return query.select_from(model).outerjoin(SHOW_STATS[model]).filter(not_deleted(model))
+
+
+def get_api_fields(available):
+    fields = request.args.get('fields')
+    if fields is None:
+        return list(available)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if len(fields) == 0 or len(unknown) > 0:
+        abort(api_error(400, f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}"))
+    return fields
+
+
+def api_error(status, message):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+
+def json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def api_collection(model, *order_by):
+    # streams the rows as one JSON array from a server-side cursor, a batch of
+    # rows per chunk, so large collections are never held in memory
+    fields = get_api_fields(get_api_columns(model))
+    batch_size = app.config['API_BATCH_SIZE']
+    rows = get_api_query(model, fields).order_by(*order_by).yield_per(batch_size)
+
+    def generate():
+        separator = '['
+        chunk = []
+        for row in rows:
+            chunk.append(separator + json.dumps(dict(zip(fields, row)), default=json_default))
+            separator = ','
+            if len(chunk) >= batch_size:
+                yield ''.join(chunk)
+                chunk = []
+        yield ''.join(chunk) + ('[]' if separator == '[' else ']')
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def api_entity(model, entity_id, counterpart):
+    # the data of the venue/artist page, past and upcoming shows included
+    available = list(get_api_columns(model)) + ['past_shows', 'upcoming_shows']
+    fields = get_api_fields(available)
+    columns = [field for field in fields if field not in ('past_shows', 'upcoming_shows')]
+    data = {}
+    if len(columns) > 0:
+        row = get_api_query(model, columns).filter(model.id == entity_id).first()
+        if row is None:
+            return api_error(404, 'Not found')
+        data.update(zip(columns, row))
+    if 'past_shows' in fields or 'upcoming_shows' in fields:
+        entity, past_shows, upcoming_shows = get_entity_shows(model, entity_id, counterpart)
+        if entity is None:
+            return api_error(404, 'Not found')
+        # the shows keep what the page needs besides these, e.g. the update
+        # dates keying its fragment cache
+        counterpart_key = counterpart.__name__.lower()
+        show_fields = [counterpart_key + '_id', counterpart_key + '_name', counterpart_key + '_image_link',
+                       'start_time']
+        shows = {'past_shows': past_shows, 'upcoming_shows': upcoming_shows}
+        data.update((field, [{key: show[key] for key in show_fields} for show in shows[field]])
+                    for field in fields if field in shows)
+    return app.response_class(json.dumps(data, default=json_default), mimetype='application/json')
+
+
+def autocomplete(model, prefix):
+    # case-insensitive prefix match, a range scan of the lower(name) COLLATE "C"
+    # index that also yields the rows in order
+    prefix = prefix.strip().lower()
+    if len(prefix) == 0:
+        return []
+    name_key = db.func.lower(model.name).collate('C')
+    pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    rows = db.session.query(model.id, model.name) \
+        .filter(name_key.like(pattern, escape='\\'), not_deleted(model)) \
+        .order_by(name_key) \
+        .limit(app.config['AUTOCOMPLETE_LIMIT'])
+    return [{'id': row.id, 'name': row.name} for row in rows]
+
+
+def is_available(available_from, available_to, at):
+    # an availability window whose end is before its start crosses midnight
+    if available_from <= available_to:
+        return available_from <= at < available_to
+    return at >= available_from or at < available_to
+
+
+def get_available_artists_query(start_time, duration, city=None, state=None, genre=None):
+    # artists whose availability window contains the start time and who have
+    # no show overlapping the period, in one query: location and genre narrow
+    # the artists through their indexes, and the bookings are probed through
+    # the GiST index of the artist exclusion constraint
+    at = start_time.time()
+    within_window = db.or_(
+        db.and_(Artist.available_from <= Artist.available_to,
+                Artist.available_from <= at, Artist.available_to > at),
+        db.and_(Artist.available_from > Artist.available_to,
+                db.or_(Artist.available_from <= at, Artist.available_to > at))
+    )
+    booked = db.exists().where(db.and_(
+        Show.artist_id == Artist.id,
+        show_period(Show.start_time, Show.duration).op('&&')(
+            db.func.tsrange(start_time, start_time + timedelta(minutes=duration))),
+        Venue.id == Show.venue_id,
+        not_deleted(Venue)
+    ))
+    query = db.session.query(Artist.id, Artist.name, Artist.city, Artist.state,
+                             Artist.available_from, Artist.available_to) \
+        .filter(within_window, ~booked, not_deleted(Artist))
+    if state:
+        query = query.filter(Artist.state == state.strip().upper())
+    if city:
+        query = query.filter(db.func.lower(Artist.city) == city.strip().lower())
+    if genre:
+        query = query.join(artist_genres).join(Genre).filter(Genre.name == genre)
+    return query
+
+
+def validate_entity_id(model, name_field):
+    # checks only the submitted id and fills in its name for a re-rendered form
+    def validator(form, field):
+        entity = get_entity(model, int(field.data)) if field.data.isdigit() else None
+        if entity is None:
+            raise ValidationError(f'Unknown {model.__name__.lower()}')
+        form[name_field].data = entity.name
+    return validator
+
+
+validate_artist_id = validate_entity_id(Artist, 'artist_name')
+validate_venue_id = validate_entity_id(Venue, 'venue_name')
+
+
+SHOW_CONFLICTS = {
+    'ex_shows_venue_id_period': 'The venue already has a show at that time',
+    'ex_shows_artist_id_period': 'The artist already has a show at that time',
+}
+
+
+def overlapping_shows(venue_id, artist_id, start_time, duration):
+    # shows of the venue or the artist overlapping the given period, found
+    # through the GiST indexes of the exclusion constraints
+    overlaps = show_period(Show.start_time, Show.duration).op('&&')(
+        db.func.tsrange(start_time, start_time + timedelta(minutes=duration)))
+    return Show.query \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(db.or_(Show.venue_id == venue_id, Show.artist_id == artist_id), overlaps)
+
+
+def get_conflicting_shows(venue_id, artist_id, start_time, duration):
+    return overlapping_shows(venue_id, artist_id, start_time, duration) \
+        .filter(not_deleted(Venue), not_deleted(Artist)) \
+        .with_entities(Show.venue_id, Venue.name, Show.artist_id, Artist.name, Show.start_time, Show.duration) \
+        .order_by(Show.start_time) \
+        .all()
+
+
+def remove_deleted_conflicts(venue_id, artist_id, start_time, duration):
+    # the exclusion constraints still see the shows of a soft deleted venue or
+    # artist until they are purged; the ones in the way of a new show go now
+    show_ids = [row[0] for row in overlapping_shows(venue_id, artist_id, start_time, duration)
+                .filter(db.or_(Venue.deleted_at.isnot(None), Artist.deleted_at.isnot(None)))
+                .with_entities(Show.id)]
+    if len(show_ids) > 0:
+        Show.query.filter(Show.id.in_(show_ids)).delete(synchronize_session=False)
+
+
+def get_free_slots(entity_column, entity_id, start, end):
+    # gaps between the shows of a venue (or artist) within [start, end); the
+    # overlapping shows come from an index lookup, never a scan of the table
+    window = db.func.tsrange(start, end)
+    shows = db.session.query(Show.start_time, Show.duration) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(entity_column == entity_id, show_period(Show.start_time, Show.duration).op('&&')(window),
+                not_deleted(Venue), not_deleted(Artist)) \
+        .order_by(Show.start_time) \
+        .all()
+    slots = []
+    free_from = start
+    for show_start, duration in shows:
+        if show_start > free_from:
+            slots.append((free_from, show_start))
+        free_from = max(free_from, show_start + timedelta(minutes=duration))
+    if free_from < end:
+        slots.append((free_from, end))
+    return slots
+
+
+def validate_no_conflicts(form, field):
+    duration = form.duration.data
+    if form.artist_id.errors or form.venue_id.errors or field.errors or not isinstance(duration, int) or duration < 1:
+        return
+    conflicts = get_conflicting_shows(int(form.venue_id.data), int(form.artist_id.data),
+                                      form.start_time.data, duration)
+    messages = []
+    for venue_id, venue_name, artist_id, artist_name, start_time, duration in conflicts:
+        end_time = start_time + timedelta(minutes=duration)
+        period = f"{start_time.strftime('%Y-%m-%d %H:%M')} - {end_time.strftime('%H:%M')}"
+        if venue_id == int(form.venue_id.data):
+            messages.append(f"Venue '{venue_name}' is booked {period} by '{artist_name}'")
+        if artist_id == int(form.artist_id.data):
+            messages.append(f"Artist '{artist_name}' plays {period} at '{venue_name}'")
+    if len(messages) > 0:
+        raise ValidationError('; '.join(messages))
+
+
 def validate_start_time(form, field):
     start_time = form.start_time.data
     if start_time <= datetime.now():
         raise ValidationError("Cannot add a show in the past")
+    if form.artist_id.errors:
+        return
     artist = Artist.query.get(form.artist_id.data)
-    if artist.available_from > start_time.time() or start_time.time() >= artist.available_to:
+    if not is_available(artist.available_from, artist.available_to, start_time.time()):
         raise ValidationError(
             f"Artist '{artist.name}' is available only at {artist.available_from.strftime('%H:%M')}"
             + f" - {artist.available_to.strftime('%H:%M')}")
@@ -601,13 +1511,156 @@ def validate_start_time(form, field):
 
 def get_ShowForm():
     form = ShowForm()
-    form.artist_id.choices = [(str(a.id), a.name) for a in Artist.query.order_by(Artist.name).all()]
-    form.venue_id.choices = [(str(v.id), v.name) for v in Venue.query.order_by(Venue.name).all()]
+    if validate_artist_id not in form.artist_id.validators:
+        form.artist_id.validators += (validate_artist_id,)
+    if validate_venue_id not in form.venue_id.validators:
+        form.venue_id.validators += (validate_venue_id,)
     if validate_start_time not in form.start_time.validators:
         form.start_time.validators += (validate_start_time,)
+    if validate_no_conflicts not in form.start_time.validators:
+        form.start_time.validators += (validate_no_conflicts,)
     return form
 
 
+@app.cli.command('refresh-stats')
+@click.option('--full', is_flag=True, help='Recompute every venue and artist instead of rolling started shows.')
+def refresh_stats(full):
+    """Refresh the materialized past/upcoming show counts; run it on a schedule."""
+    updated = refresh_show_stats(full)
+    response_cache.invalidate('shows')
+    click.echo(f'Refreshed show statistics of {updated} venues and artists.')
+
+
+@app.cli.command('worker')
+@click.option('--threads', default=2, show_default=True, help='Jobs run concurrently.')
+def worker(threads):
+    """Run the background jobs until interrupted or terminated."""
+    # a running job is finished before the worker stops
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stop.set())
+    click.echo(f"Running jobs {', '.join(sorted(jobs.handlers))} with {threads} threads.")
+    jobs.run_worker(threads, stop, echo=click.echo)
+    click.echo('Stopped.')
+
+
+@app.cli.command('purge-deleted')
+@click.option('--batch-size', default=500, show_default=True, help='Shows deleted per transaction.')
+def purge_deleted_command(batch_size):
+    """Remove deleted venues and artists with their shows; run it on a schedule."""
+    purged = purge_deleted(batch_size, echo=click.echo)
+    if purged > 0:
+        response_cache.invalidate('venues', 'artists', 'shows')
+    click.echo(f'Purged {purged} venues and artists.')
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Rows loaded per COPY batch.')
+def import_data(kind, path, batch_size):
+    """Bulk load venues, artists or shows from a CSV or JSON lines file.
+
+    Venues and artists are upserted on their name; shows may reference them
+    by name (venue, artist) or by id (venue_id, artist_id) and give a duration
+    in minutes (default 120).
+    """
+    total, unknown, overlapping = import_file(db.engine, kind, path, batch_size, echo=click.echo)
+    if kind == 'shows':
+        refresh_show_stats(full=True)
+    response_cache.invalidate('venues', 'artists', 'shows')
+    click.echo(f'Imported {total - unknown - overlapping} {kind}.')
+    if unknown:
+        click.echo(f'Skipped {unknown} naming unknown or deleted venues or artists.')
+    if overlapping:
+        click.echo(f'Skipped {overlapping} overlapping other shows.')
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Bundle, minify, fingerprint and precompress the static files."""
+    build_assets(app.static_folder, echo=click.echo)
+
+
+def use_bench_database():
+    # the benchmarks create and edit venues, artists and shows, so they only
+    # ever run against a database of their own, without the replicas
+    url = app.config.get('BENCH_DATABASE_URL')
+    if not url:
+        raise click.ClickException('Set BENCH_DATABASE_URL to a database dedicated to the benchmarks.')
+    if url in [app.config['SQLALCHEMY_DATABASE_URI']] + app.config.get('DATABASE_REPLICA_URIS', []):
+        raise click.ClickException('BENCH_DATABASE_URL must not be the application database.')
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['DATABASE_REPLICA_URIS'] = []
+
+
+@app.cli.command('bench-data')
+@click.option('--shows', default=10000, show_default=True, help='Number of shows, from 1000 up to 1000000.')
+@click.option('--seed', default=0, show_default=True)
+def bench_data(shows, seed):
+    """Load a synthetic dataset for the benchmarks (20 shows per venue, 10 per artist)."""
+    use_bench_database()
+    benchmark.generate_dataset(db.engine, shows, seed, echo=click.echo)
+    refresh_show_stats(full=True)
+    response_cache.invalidate('venues', 'artists', 'shows')
+
+
+@app.cli.command('bench')
+@click.option('--rounds', default=20, show_default=True, help='Requests per route.')
+@click.option('--baseline', default='bench_baseline.json', show_default=True, type=click.Path(dir_okay=False))
+@click.option('--update', is_flag=True, help='Store the results as the new baseline.')
+@click.option('--tolerance', default=0.2, show_default=True, help='Allowed p95 latency growth.')
+@click.option('--route', 'routes', multiple=True, help='Only run the given routes.')
+@click.option('--cache/--no-cache', default=False, help='Keep the response cache enabled.')
+def bench(rounds, baseline, update, tolerance, routes, cache):
+    """Benchmark every route and fail on latency or query count regressions."""
+    use_bench_database()
+    response_cache.enabled = cache
+    results = benchmark.run_benchmarks(app, db.engine, images, rounds, only=routes)
+    for name, result in results.items():
+        click.echo(f"{name:24} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                   f"p99 {result['p99_ms']:8.2f}ms  {result['queries']:3} queries  {result['statuses']}")
+    if update or not os.path.exists(baseline):
+        benchmark.save_baseline(baseline, results)
+        click.echo(f'Baseline written to {baseline}')
+        return
+    regressions = benchmark.compare(results, benchmark.load_baseline(baseline), tolerance)
+    for regression in regressions:
+        click.echo('REGRESSION ' + regression)
+    if len(regressions) > 0:
+        raise SystemExit(1)
+
+
+@app.cli.command('bench-filter')
+@click.option('--rows', default=1000, show_default=True, help='Values formatted per round.')
+@click.option('--distinct', default=100, show_default=True, help='Different start times among them.')
+def bench_filter(rows, distinct):
+    """Compare the datetime filter with parsing and formatting every value."""
+    format_datetime_value.cache_clear()
+    result = benchmark.benchmark_datetime_filter(format_datetime, DATETIME_FORMATS['medium'], rows, distinct)
+    click.echo(f"parsing every value {result['parsing_us']:8.2f}us/row")
+    click.echo(f"datetime filter     {result['filter_us']:8.2f}us/row")
+    click.echo(f"saving              {result['parsing_us'] / result['filter_us']:8.1f}x")
+
+
+@app.cli.command('db-status')
+def db_status():
+    """Show the primary and the read replicas with their replication lag."""
+    for name, engine in [('primary', db.engine)] + [(f'replica{i}', e) for i, e in enumerate(db.get_replicas())]:
+        in_recovery, lag = engine.execute(
+            'SELECT pg_is_in_recovery(), now() - pg_last_xact_replay_timestamp()').first()
+        click.echo(f"{name:10} {engine.url!r}  {'replica' if in_recovery else 'primary'}"
+                   + (f', lag {lag}' if lag is not None else ''))
+
+
+@app.cli.command('explain-check')
+def explain_check():
+    """EXPLAIN the queries of the main routes and check they use their indexes."""
+    response_cache.enabled = False
+    if check_route_indexes(app, db.engine) > 0:
+        raise SystemExit(1)
+
+
 if not app.debug:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
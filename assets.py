@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+import brotli
+import rcssmin
+import rjsmin
+from flask import current_app, request, send_from_directory, url_for
+
+# bundle name -> sources under static/, in load order. The CSS sources all sit
+# one level below static/, like dist/, so their relative url()s still resolve.
+BUNDLES = {
+    'app.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css', 'css/main.responsive.css',
+                'css/main.quickfix.css'],
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'app.js': ['js/libs/jquery-1.11.1.min.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js', 'js/script.js'],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class Assets:
+    """Bundled, minified and fingerprinted static files.
+
+    ``flask build-assets`` writes every bundle to ``static/dist`` under a name
+    carrying the hash of its content, next to gzip and brotli variants, and
+    records the names in ``manifest.json``. ``asset_urls(bundle)`` gives the
+    templates the built file, or the separate sources while there is no build.
+    A built file never changes, so it is served with an immutable far-future
+    ``Cache-Control``, precompressed when the client accepts it.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self._manifest = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = os.path.join(app.static_folder, DIST)
+        app.add_template_global(self.asset_urls)
+        app.view_functions['static'] = self.send_static_file
+
+    def manifest(self):
+        # read once per process; the build runs before the workers start
+        if self._manifest is None:
+            try:
+                with open(os.path.join(self.directory, MANIFEST)) as file:
+                    self._manifest = json.load(file)
+            except (OSError, ValueError):
+                self._manifest = {}
+        return self._manifest
+
+    def asset_urls(self, bundle):
+        name = self.manifest().get(bundle)
+        if name is not None:
+            return [url_for('static', filename=f'{DIST}/{name}')]
+        return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+    def send_static_file(self, filename):
+        if not filename.startswith(DIST + '/'):
+            return current_app.send_static_file(filename)
+        name = filename[len(DIST) + 1:]
+        mimetype = mimetypes.guess_type(name)[0]
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[encoding] and os.path.isfile(os.path.join(self.directory, name + suffix)):
+                response = send_from_directory(self.directory, name + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.directory, name, mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def build_assets(static_folder, echo=print):
+    directory = os.path.join(static_folder, DIST)
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for bundle, sources in BUNDLES.items():
+        content = bundle_content(static_folder, bundle, sources)
+        stem, extension = os.path.splitext(bundle)
+        name = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+        path = os.path.join(directory, name)
+        _write(path, content)
+        _write(path + '.gz', gzip.compress(content, 9, mtime=0))
+        _write(path + '.br', brotli.compress(content))
+        manifest[bundle] = name
+        echo(f'{bundle}: {len(sources)} files, {len(content)} bytes -> {DIST}/{name}')
+    _write(os.path.join(directory, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def bundle_content(static_folder, bundle, sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as file:
+            text = file.read()
+        if '.min.' not in source:
+            text = rcssmin.cssmin(text) if bundle.endswith('.css') else rjsmin.jsmin(text)
+        parts.append(text.strip())
+    # the semicolons keep a script without a trailing one from running into
+    # the next
+    separator = '\n' if bundle.endswith('.css') else ';\n'
+    return (separator.join(parts) + '\n').encode('utf-8')
+
+
+def _write(path, content):
+    with open(path + '.tmp', 'wb') as file:
+        file.write(content)
+    os.replace(path + '.tmp', path)
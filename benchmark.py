@@ -0,0 +1,300 @@
+import csv
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+from PIL import Image
+from sqlalchemy import event
+
+from forms import ArtistForm
+from importer import import_file
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'), ('Brooklyn', 'NY'), ('Chicago', 'IL'),
+    ('Austin', 'TX'), ('Houston', 'TX'), ('Seattle', 'WA'), ('Portland', 'OR'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Miami', 'FL'), ('Boston', 'MA'), ('Denver', 'CO'), ('Atlanta', 'GA'),
+]
+GENRES = [choice for choice, label in ArtistForm.genres.kwargs['choices']]
+
+
+# ----------------------------------------------------------------------------#
+# Synthetic data.
+# ----------------------------------------------------------------------------#
+
+def generate_dataset(engine, shows, seed=0, echo=print):
+    # one venue per 20 shows and one artist per 10 shows, written to temporary
+    # CSV files and loaded through the bulk importer
+    rng = random.Random(seed)
+    venues = max(shows // 20, 1)
+    artists = max(shows // 10, 1)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    with tempfile.TemporaryDirectory() as directory:
+        def write(kind, count, row):
+            path = os.path.join(directory, kind + '.csv')
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(row(None).keys())
+                for i in range(count):
+                    writer.writerow(row(i).values())
+            import_file(engine, kind, path, echo=echo)
+
+        def venue(i):
+            city, state = rng.choice(CITIES)
+            return {
+                'name': f'Bench Venue {i}', 'city': city, 'state': state, 'address': f'{i} Main Street',
+                'phone': '555-000-0000', 'genres': ','.join(rng.sample(GENRES, 3)),
+                'image_link': f'https://example.com/venues/{i}.jpg', 'seeking_talent': rng.random() < 0.5
+            }
+
+        def artist(i):
+            city, state = rng.choice(CITIES)
+            return {
+                'name': f'Bench Artist {i}', 'city': city, 'state': state, 'phone': '555-000-0000',
+                'genres': ','.join(rng.sample(GENRES, 2)), 'image_link': f'https://example.com/artists/{i}.jpg',
+                'seeking_venue': rng.random() < 0.5
+            }
+
+        def show(i):
+            return {
+                'venue': f'Bench Venue {rng.randrange(venues)}',
+                'artist': f'Bench Artist {rng.randrange(artists)}',
+                'start_time': now + timedelta(hours=rng.randrange(-24 * 365, 24 * 365))
+            }
+
+        write('venues', venues, venue)
+        write('artists', artists, artist)
+        write('shows', shows, show)
+
+
+# ----------------------------------------------------------------------------#
+# Route benchmarks.
+# ----------------------------------------------------------------------------#
+
+def get_routes(app, engine, images, rng):
+    venue_ids = [row[0] for row in engine.execute('SELECT id FROM venues ORDER BY random() LIMIT 20')]
+    artist_ids = [row[0] for row in engine.execute('SELECT id FROM artists ORDER BY random() LIMIT 20')]
+    counter = iter(range(10 ** 9))
+    first_show = (datetime.now() + timedelta(days=30)).replace(second=0, microsecond=0)
+
+    # the venue images are served from sources stored up front, not fetched
+    source = io.BytesIO()
+    Image.effect_noise((1600, 1200), 64).convert('RGB').save(source, 'JPEG', quality=90)
+    for venue_id in venue_ids:
+        link = engine.execute('SELECT image_link FROM venues WHERE id = %s', venue_id).scalar()
+        if link:
+            images.add_source(link, source.getvalue())
+
+    def show_form():
+        # one-minute shows a day apart, starting at the current minute, so they
+        # overlap neither each other nor the shows of earlier runs
+        start_time = first_show + timedelta(days=next(counter))
+        return {'venue_id': str(rng.choice(venue_ids)), 'artist_id': str(rng.choice(artist_ids)),
+                'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'), 'duration': '1'}
+
+    def venue_form():
+        city, state = rng.choice(CITIES)
+        return {'name': f'Bench Venue new {time.time_ns()} {next(counter)}', 'city': city, 'state': state,
+                'address': '1 Main Street', 'genres': rng.sample(GENRES, 2)}
+
+    def artist_form():
+        city, state = rng.choice(CITIES)
+        return {'name': f'Bench Artist new {time.time_ns()} {next(counter)}', 'city': city, 'state': state,
+                'genres': rng.sample(GENRES, 2), 'available_from': '00:00', 'available_to': '23:59'}
+
+    def entity_name(table, path):
+        return engine.execute(f'SELECT name FROM {table} WHERE id = %s', int(path.split('/')[2])).scalar()
+
+    def new_venue():
+        # the deletes take rows made for them, the dataset keeps its own
+        form = venue_form()
+        return engine.execute('INSERT INTO venues (name, city, state, address, seeking_talent, insert_date) '
+                              'VALUES (%s, %s, %s, %s, false, now()) RETURNING id',
+                              form['name'], form['city'], form['state'], form['address']).scalar()
+
+    def new_artist():
+        form = artist_form()
+        return engine.execute('INSERT INTO artists (name, city, state, seeking_venue, insert_date, available_from, '
+                              "available_to) VALUES (%s, %s, %s, false, now(), '00:00', '23:59') RETURNING id",
+                              form['name'], form['city'], form['state']).scalar()
+
+    # generators of the rule arguments, by name, and of the arguments of one
+    # endpoint that differ from them
+    arguments = {
+        'venue_id': lambda: rng.choice(venue_ids),
+        'artist_id': lambda: rng.choice(artist_ids),
+        'genre': lambda: rng.choice(GENRES),
+        'kind': lambda: 'venue',
+        'entity_id': lambda: rng.choice(venue_ids),
+        'size': lambda: rng.choice(list(images.sizes)),
+        'filename': lambda: rng.choice(['css/main.css', 'js/script.js', 'img/front-splash.jpg']),
+    }
+    endpoint_arguments = {
+        'delete_venue': {'venue_id': new_venue},
+        'delete_artist': {'artist_id': new_artist},
+    }
+    # query strings of the GET endpoints that read one
+    queries = {
+        'autocomplete_artists': lambda: {'q': f'bench artist {rng.randrange(100)}'},
+        'autocomplete_venues': lambda: {'q': f'bench venue {rng.randrange(100)}'},
+        'available_artists': lambda: dict(zip(('start_time', 'city', 'state', 'genre'), (
+            first_show.strftime('%Y-%m-%dT21:00'), *rng.choice(CITIES), rng.choice(GENRES)))),
+        'venue_free_slots': lambda: {'date': first_show.strftime('%Y-%m-%d')},
+    }
+    # (name, form data factory taking the url) for every POST endpoint; the
+    # create_/edit_ submissions carry a CSRF token from their form page
+    forms = {
+        'search_venues': [
+            ('search_venues', lambda path: {'search_term': rng.choice(['Venue 1', 'hop'])}),
+            ('search_venues_city', lambda path: {'search_term': '{}, {}'.format(*rng.choice(CITIES))}),
+        ],
+        'search_artists': [('search_artists', lambda path: {'search_term': rng.choice(['Artist 2', 'a'])})],
+        'create_venue_submission': [('create_venue_submission', lambda path: venue_form())],
+        'create_artist_submission': [('create_artist_submission', lambda path: artist_form())],
+        'create_show_submission': [('create_show_submission', lambda path: show_form())],
+        'edit_venue_submission': [
+            ('edit_venue_submission', lambda path: dict(venue_form(), name=entity_name('venues', path)))],
+        'edit_artist_submission': [
+            ('edit_artist_submission', lambda path: dict(artist_form(), name=entity_name('artists', path)))],
+    }
+
+    adapter = app.url_map.bind('localhost')
+
+    def url_factory(rule, method):
+        generators = dict(arguments, **endpoint_arguments.get(rule.endpoint, {}))
+        query = queries.get(rule.endpoint, dict)
+
+        def url():
+            values = {argument: generators[argument]() for argument in rule.arguments}
+            return adapter.build(rule.endpoint, dict(query(), **values), method=method)
+        return url
+
+    # every rule of the app is benchmarked; one without a generator for an
+    # argument or for its form data fails the run, so a new route cannot go
+    # unmeasured
+    routes = []
+    for rule in app.url_map.iter_rules():
+        missing = [argument for argument in rule.arguments
+                   if argument not in arguments and argument not in endpoint_arguments.get(rule.endpoint, {})]
+        if len(missing) > 0:
+            raise ValueError(f"No benchmark generator for {', '.join(missing)} of {rule.rule}")
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if method == 'POST':
+                if rule.endpoint not in forms:
+                    raise ValueError(f'No benchmark form data for POST {rule.rule}')
+                for name, data in forms[rule.endpoint]:
+                    routes.append((name, 'post', url_factory(rule, method), data))
+            else:
+                routes.append((rule.endpoint, method.lower(), url_factory(rule, method), None))
+    return routes
+
+
+def csrf_token(client, path):
+    match = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', client.get(path).get_data(as_text=True))
+    return match.group(1) if match else None
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_benchmarks(app, engine, images, rounds=20, seed=0, only=None):
+    rng = random.Random(seed)
+    client = app.test_client()
+    queries = [0]
+
+    def count_query(*args):
+        queries[0] += 1
+
+    event.listen(engine, 'before_cursor_execute', count_query)
+    results = {}
+    try:
+        for name, method, url, data in get_routes(app, engine, images, rng):
+            if only and name not in only:
+                continue
+            latencies = []
+            query_counts = []
+            statuses = set()
+            for _ in range(rounds):
+                path = url()
+                form = data(path) if data is not None else None
+                if method == 'post' and name.startswith(('create_', 'edit_')):
+                    form['csrf_token'] = csrf_token(client, path)
+                queries[0] = 0
+                started = time.perf_counter()
+                response = getattr(client, method)(path, data=form)
+                latencies.append((time.perf_counter() - started) * 1000)
+                query_counts.append(queries[0])
+                statuses.add(response.status_code)
+            results[name] = {
+                'p50_ms': round(percentile(latencies, 0.50), 2),
+                'p95_ms': round(percentile(latencies, 0.95), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'queries': max(query_counts),
+                'statuses': sorted(statuses)
+            }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    # a route regresses when its p95 latency grows beyond the tolerance or it
+    # issues more queries than in the baseline
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']}ms > {expected['p95_ms']}ms")
+        if result['queries'] > expected['queries']:
+            regressions.append(f"{name}: {result['queries']} queries > {expected['queries']}")
+        if any(status >= 500 for status in result['statuses']):
+            regressions.append(f"{name}: server error {result['statuses']}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+# ----------------------------------------------------------------------------#
+# Filter micro-benchmark.
+# ----------------------------------------------------------------------------#
+
+def benchmark_datetime_filter(format_datetime, pattern, rows=1000, distinct=100, rounds=5, seed=0):
+    # formats a page worth of start times, `distinct` of them different, with
+    # the filter as it was (parsing the value's string and resolving the
+    # pattern every time) and with the given one; microseconds per row
+    rng = random.Random(seed)
+    now = datetime.now().replace(second=0, microsecond=0)
+    start_times = [now + timedelta(hours=rng.randrange(-24 * 365, 24 * 365)) for _ in range(distinct)]
+    values = [rng.choice(start_times) for _ in range(rows)]
+
+    def parsing(value):
+        return babel.dates.format_datetime(dateutil.parser.parse(str(value)), pattern)
+
+    def run(format_value):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for value in values:
+                format_value(value)
+            timings.append((time.perf_counter() - started) / rows * 10 ** 6)
+        return min(timings)
+
+    return {'parsing_us': run(parsing), 'filter_us': run(format_datetime)}
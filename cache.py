@@ -0,0 +1,406 @@
+import os
+import pickle
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import quote
+
+from flask import g, has_request_context, make_response, request, session
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+# ----------------------------------------------------------------------------#
+# Backends.
+# ----------------------------------------------------------------------------#
+
+class MemoryBackend:
+    """In-process LRU store bounded by entry count and approximate size.
+
+    A timeout of 0 keeps the entry until it is evicted.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, default_timeout=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_timeout = default_timeout
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, size, value = item
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires = time.monotonic() + timeout if timeout else None
+        size = _sizeof(key) + _sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires, size, value)
+            self.size += size
+            while len(self._data) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def set_many(self, mapping, timeout=None):
+        for key, value in mapping.items():
+            self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _remove(self, key):
+        expires, size, value = self._data.pop(key)
+        self.size -= size
+
+
+class RedisBackend:
+    """Shared store for running several workers or hosts against one cache."""
+
+    def __init__(self, url, default_timeout=60, prefix='fyyur:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.default_timeout = default_timeout
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def get_many(self, keys):
+        if len(keys) == 0:
+            return []
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [pickle.loads(value) if value is not None else None for value in values]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=timeout or None)
+
+    def set_many(self, mapping, timeout=None):
+        pipeline = self.client.pipeline()
+        timeout = self.default_timeout if timeout is None else timeout
+        for key, value in mapping.items():
+            pipeline.set(self.prefix + key, pickle.dumps(value), ex=timeout or None)
+        pipeline.execute()
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if len(keys) > 0:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + 'response:*'))
+
+
+class FileTagStore:
+    """Tag versions shared through a directory, one small file per tag.
+
+    Used with the memory backend, so an invalidation made by any worker
+    process (or by ``flask worker``) reaches the entries kept by all of them.
+    Each process keeps the versions it has read; every write also replaces
+    a generation file, and a changed generation drops what was kept, so a
+    lookup reads one file until something is invalidated.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.generation_path = os.path.join(directory, '.generation')
+        self._generation = None
+        self._versions = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_many(self, keys):
+        generation = self._read(self.generation_path)
+        with self._lock:
+            if generation != self._generation:
+                # a new dict, so reads begun under the old generation land in the old one
+                self._versions = {}
+                self._generation = generation
+            versions = self._versions
+        values = []
+        for key in keys:
+            value = versions.get(key)
+            if value is None:
+                # a missing tag is not kept: the write creating it may come
+                # from another process
+                value = self._read(self._path(key))
+                if value is not None:
+                    versions[key] = value
+            values.append(value)
+        return values
+
+    def set_many(self, mapping, timeout=None):
+        for key, value in mapping.items():
+            self._write(self._path(key), value)
+        self._write(self.generation_path, uuid.uuid4().hex)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as file:
+                return file.read() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write(path, value):
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(value)
+        os.replace(temporary, path)
+
+    def _path(self, key):
+        return os.path.join(self.directory, quote(key, safe=''))
+
+
+def _sizeof(value):
+    if isinstance(value, (bytes, str)):
+        return len(value) + 64
+    if isinstance(value, dict):
+        return sum(_sizeof(k) + _sizeof(v) for k, v in value.items()) + 64
+    if isinstance(value, (list, tuple)):
+        return sum(_sizeof(v) for v in value) + 64
+    return sys.getsizeof(value)
+
+
+# ----------------------------------------------------------------------------#
+# Response cache.
+# ----------------------------------------------------------------------------#
+
+class ResponseCache:
+    """Caches rendered GET responses and invalidates them by tag.
+
+    Every tag has a version token in the tag store (the Redis backend itself,
+    or files shared by the worker processes). A cached entry remembers
+    the versions of its tags when it was stored and is served only while they
+    are unchanged, so ``invalidate('venue:1')`` drops every page built from
+    venue 1 without having to know their keys. A tag whose token got evicted
+    simply gets a new one, which makes its entries stale rather than
+    resurrecting them.
+
+    A version also records when its tag was invalidated. A page read from a
+    replica within ``DATABASE_STICKY_SECONDS`` of that may predate the change
+    on a lagging replica, so it is served but not stored.
+    """
+
+    def __init__(self, app=None, backend=None, tags=None):
+        self.backend = backend
+        self.tags = tags
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.replica_lag = 10
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        self.replica_lag = app.config.get('DATABASE_STICKY_SECONDS', 10)
+        if self.backend is None:
+            timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+            if app.config.get('CACHE_BACKEND', 'memory') == 'redis':
+                self.backend = RedisBackend(app.config['CACHE_REDIS_URL'], default_timeout=timeout)
+            else:
+                self.backend = MemoryBackend(
+                    max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+                    max_bytes=app.config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024),
+                    default_timeout=timeout
+                )
+        if self.tags is None:
+            # the entries of the memory backend are per process, their tag
+            # versions are not: every worker must see every invalidation
+            if isinstance(self.backend, MemoryBackend):
+                self.tags = FileTagStore(app.config.get('CACHE_TAG_DIR')
+                                         or os.path.join(app.instance_path, 'cache-tags'))
+            else:
+                self.tags = self.backend
+
+    def cached(self, *tags, timeout=None):
+        # tags may reference the view arguments, e.g. 'venue:{venue_id}'
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not self._is_cacheable_request():
+                    return view(**kwargs)
+                key = 'response:' + request.full_path
+                entry = self.backend.get(key)
+                if entry is not None and self._is_fresh(entry['tags']):
+                    self._count('hits')
+                    return self._to_response(entry).make_conditional(request)
+                self._count('misses')
+                g.cache_tags = self._versions([tag.format(**kwargs) for tag in tags])
+                response = make_response(view(**kwargs))
+                if response.status_code == 200 and 'Set-Cookie' not in response.headers \
+                        and self._is_settled(g.cache_tags):
+                    entry = {
+                        'status': response.status_code,
+                        'headers': list(response.headers.items()),
+                        'tags': g.cache_tags
+                    }
+                    if response.is_streamed:
+                        original = response.response
+                        response.response = self._store_stream(key, entry, response.iter_encoded(), timeout)
+                        if hasattr(original, 'close'):
+                            response.call_on_close(original.close)
+                    else:
+                        entry['body'] = response.get_data()
+                        self.backend.set(key, entry, timeout)
+                return response
+            return wrapper
+        return decorator
+
+    def tag(self, *tags):
+        # adds tags found while building the response, e.g. the artists listed
+        # on a venue page
+        if has_request_context() and 'cache_tags' in g:
+            g.cache_tags.update(self._versions([tag for tag in tags if tag not in g.cache_tags]))
+
+    def invalidate(self, *tags):
+        now = time.time()
+        self.tags.set_many({'tag:' + tag: f'{now:.3f}:{uuid.uuid4().hex}' for tag in tags}, timeout=0)
+        self._count('invalidations', len(tags))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / requests if requests > 0 else 0.0,
+            'invalidations': self.invalidations,
+            'entries': len(self.backend),
+            'bytes': getattr(self.backend, 'size', None)
+        }
+
+    def _store_stream(self, key, entry, chunks, timeout):
+        # a streamed page is stored once it has been sent in full; one the
+        # client abandoned is not stored at all
+        body = []
+        for chunk in chunks:
+            body.append(chunk)
+            yield chunk
+        entry['body'] = b''.join(body)
+        self.backend.set(key, entry, timeout)
+
+    @staticmethod
+    def _to_response(entry):
+        response = make_response(entry['body'], entry['status'])
+        response.headers.clear()
+        response.headers.extend(entry['headers'])
+        return response
+
+    def _is_cacheable_request(self):
+        # pages carrying flashed messages are personal, never share them
+        return self.enabled and request.method in ('GET', 'HEAD') and not session.get('_flashes')
+
+    def _is_fresh(self, versions):
+        tags = list(versions)
+        current = self.tags.get_many(['tag:' + tag for tag in tags])
+        return all(versions[tag] == version for tag, version in zip(tags, current))
+
+    def _is_settled(self, versions):
+        # g.replica is set by the database session once the request has read
+        # from a replica
+        if g.get('replica') is None:
+            return True
+        invalidated = max((_invalidated_at(version) for version in versions.values()), default=0.0)
+        return time.time() - invalidated >= self.replica_lag
+
+    def _versions(self, tags):
+        if len(tags) == 0:
+            return {}
+        current = self.tags.get_many(['tag:' + tag for tag in tags])
+        versions = dict(zip(tags, current))
+        missing = {tag: f'0:{uuid.uuid4().hex}' for tag, version in versions.items() if version is None}
+        if len(missing) > 0:
+            self.tags.set_many({'tag:' + tag: version for tag, version in missing.items()}, timeout=0)
+            versions.update(missing)
+        return versions
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+
+def _invalidated_at(version):
+    # versions written before they carried a time count as settled
+    stamp, _, token = version.partition(':')
+    return float(stamp) if token else 0.0
+
+
+# ----------------------------------------------------------------------------#
+# Fragment cache.
+# ----------------------------------------------------------------------------#
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'venue-card', venue.id, venue.update_date %}...{% endcache %}``
+
+    Stores the rendered block under its key in ``environment.fragment_cache``.
+    The key carries the versions of everything the block shows (ids and
+    update dates), so an edit makes a new key instead of invalidating the old
+    one, which simply ages out of the LRU. The store is per process: a lookup
+    per fragment has to be cheaper than rendering it.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(key)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = 'fragment:' + ':'.join(str(part) for part in key)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = str(caller())
+            cache.set(key, fragment)
+        return Markup(fragment)
@@ -0,0 +1,91 @@
+import gzip
+import itertools
+import zlib
+
+from flask import request
+
+COMPRESS_MIMETYPES = ('text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript',
+                      'application/json')
+
+
+class Compress:
+    """gzip for text responses of at least ``COMPRESS_MIN_SIZE`` bytes.
+
+    A streamed response is compressed as it streams: its first chunks are
+    read until they reach the threshold, and every chunk after that is sent
+    as soon as it is compressed. A stream that ends below the threshold is
+    sent as it is. Files sent from disk are left alone; the static bundles
+    come precompressed.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.min_size = 1024
+        self.level = 6
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+        self.level = app.config.get('COMPRESS_LEVEL', 6)
+        app.after_request(self.compress)
+
+    def compress(self, response):
+        if not self.enabled or not self._is_compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        if not request.accept_encodings['gzip']:
+            return response
+        if response.status_code == 304:
+            self._weaken_etag(response)
+            return response
+        if response.is_streamed:
+            original = response.response
+            chunks = response.iter_encoded()
+            head = []
+            size = 0
+            for chunk in chunks:
+                head.append(chunk)
+                size += len(chunk)
+                if size >= self.min_size:
+                    break
+            else:
+                response.set_data(b''.join(head))
+                return response
+            response.response = self._compress_stream(itertools.chain(head, chunks))
+            if hasattr(original, 'close'):
+                response.call_on_close(original.close)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(gzip.compress(data, self.level))
+        response.headers['Content-Encoding'] = 'gzip'
+        self._weaken_etag(response)
+        return response
+
+    def _compress_stream(self, chunks):
+        # every chunk is flushed, so the client can render it right away
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    @staticmethod
+    def _weaken_etag(response):
+        # the compressed body is another representation of the same page, so a
+        # strong validator becomes weak; If-None-Match still matches it
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+
+    @staticmethod
+    def _is_compressible(response):
+        return (
+            response.status_code in (200, 304)
+            and response.mimetype in COMPRESS_MIMETYPES
+            and 'Content-Encoding' not in response.headers
+            and not response.direct_passthrough
+        )
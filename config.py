@@ -9,4 +9,105 @@ DEBUG = True
 # Connect to the database
 
 
-SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost:5432/Fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://postgres@localhost:5432/Fyyur')
+
+# Connection pool of every engine (primary and replicas), per worker process.
+# pool_pre_ping replaces connections the server closed; pool_recycle retires
+# them before server or firewall idle timeouts do.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DATABASE_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW', 10)),
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+}
+
+# `flask bench-data` and `flask bench` write, and refuse to run unless this
+# points at a database of their own, e.g.
+# BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/fyyur_bench
+BENCH_DATABASE_URL = os.environ.get('BENCH_DATABASE_URL')
+
+# Connections the web workers may open to each database together; keep it
+# below Postgres' max_connections (100 by default), leaving room for
+# `flask worker` and maintenance sessions. Caps the default gunicorn workers.
+DATABASE_MAX_CONNECTIONS = int(os.environ.get('DATABASE_MAX_CONNECTIONS', 80))
+
+# Behind PgBouncer in transaction pooling mode: no pool of our own
+DATABASE_PGBOUNCER = os.environ.get('DATABASE_PGBOUNCER') == '1'
+
+# Read replicas for the GET requests, e.g.
+# DATABASE_REPLICA_URLS=postgresql://postgres@localhost:5433/Fyyur
+# After a request that wrote, the client reads from the primary for
+# DATABASE_STICKY_SECONDS so it sees its own changes.
+DATABASE_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+DATABASE_STICKY_SECONDS = 10
+
+# Number of rows per page on the paginated listings (/shows, /artists)
+LISTING_PAGE_SIZE = 50
+
+# Rows fetched per round trip from the server-side cursor (and written per
+# chunk) by the streaming JSON API
+API_BATCH_SIZE = 1000
+
+# Suggestions returned by the artist/venue typeahead endpoints
+AUTOCOMPLETE_LIMIT = 10
+
+# Response cache: 'memory' keeps an LRU per worker process, 'redis' shares
+# the entries between workers and hosts. With 'memory', the tag versions are
+# files in CACHE_TAG_DIR, so the invalidations reach every worker process on
+# the host (and those of `flask worker`)
+CACHE_BACKEND = 'memory'
+CACHE_REDIS_URL = 'redis://localhost:6379/0'
+CACHE_TAG_DIR = os.path.join(basedir, '.cache_tags')
+CACHE_DEFAULT_TIMEOUT = 60
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Rendered {% cache %} fragments, kept per worker process and keyed by the
+# versions of what they show
+FRAGMENT_CACHE_ENABLED = True
+FRAGMENT_CACHE_MAX_ENTRIES = 20000
+
+# Compiled templates are stored here, so new workers do not recompile them
+JINJA_BYTECODE_CACHE_DIR = os.path.join(basedir, '.jinja_cache')
+
+# Per-endpoint request metrics served on /metrics: every worker process writes
+# its histograms to its own file in METRICS_DIR (cleared on deploy) and the
+# scrape merges them
+METRICS_DIR = os.path.join(basedir, 'metrics')
+METRICS_FLUSH_INTERVAL = 1.0
+
+# The listing pages stream their HTML as it renders, a STREAM_BUFFER_SIZE
+# template chunks per write; off by default
+STREAM_TEMPLATES = False
+STREAM_BUFFER_SIZE = 64
+
+# gzip for text responses of at least COMPRESS_MIN_SIZE bytes
+COMPRESS_ENABLED = True
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+
+# Background jobs run by `flask worker`: a failed job is retried after
+# JOBS_RETRY_DELAY seconds, doubled with every attempt, and a job running for
+# longer than JOBS_TIMEOUT seconds is taken to have lost its worker
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10
+JOBS_TIMEOUT = 300
+JOBS_POLL_INTERVAL = 1.0
+
+# Shows deleted per transaction when deleted venues and artists are purged
+PURGE_BATCH_SIZE = 500
+
+# Venue and artist images are fetched once and served resized from
+# IMAGE_CACHE_DIR, at most IMAGE_SIZES[size] pixels wide and high; the least
+# recently served files are removed beyond IMAGE_CACHE_MAX_BYTES
+IMAGE_CACHE_DIR = os.path.join(basedir, '.image_cache')
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+IMAGE_SIZES = {'tile': 400, 'full': 1200}
+IMAGE_QUALITY = 80
+IMAGE_FETCH_TIMEOUT = 10
+IMAGE_MAX_SOURCE_BYTES = 20 * 1024 * 1024
+IMAGE_RETRY_INTERVAL = 60
+# Image links resolving to loopback, private or link-local addresses are
+# refused; allow them only where every such host is trusted
+IMAGE_ALLOW_PRIVATE_HOSTS = False
@@ -0,0 +1,89 @@
+import os
+import random
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, exc, orm
+from sqlalchemy.pool import NullPool, Pool
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+
+class RoutingSession(SignallingSession):
+    """Sends the reads of GET requests to a read replica.
+
+    Writes, flushes and raw SQL always go to the primary. A request that wrote
+    makes its client read from the primary for ``DATABASE_STICKY_SECONDS``, so
+    the page shown after a form submission includes the change even while the
+    replicas lag behind.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or isinstance(clause, (UpdateBase, TextClause)):
+            if has_request_context():
+                g.database_written = True
+        elif _reads_from_replica(self.app):
+            if 'replica' not in g:
+                g.replica = random.choice(self.db.get_replicas(self.app))
+            return g.replica
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with read replica routing and configurable pooling.
+
+    The replicas are the ``DATABASE_REPLICA_URIS``, registered as binds that
+    share ``SQLALCHEMY_ENGINE_OPTIONS``. ``DATABASE_PGBOUNCER`` switches every
+    engine to a NullPool, leaving connection pooling to PgBouncer.
+    """
+
+    def init_app(self, app):
+        if app.config.get('DATABASE_PGBOUNCER'):
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': NullPool}
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {}) or {}
+        for i, uri in enumerate(app.config.get('DATABASE_REPLICA_URIS', [])):
+            binds[f'replica{i}'] = uri
+        app.config['SQLALCHEMY_BINDS'] = binds or None
+        super().init_app(app)
+
+        @app.after_request
+        def stick_to_primary(response):
+            if g.get('database_written'):
+                session['read_primary_until'] = time.time() + app.config.get('DATABASE_STICKY_SECONDS', 10)
+            return response
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_replicas(self, app=None):
+        app = self.get_app(app)
+        keys = [key for key in (app.config['SQLALCHEMY_BINDS'] or {}) if key.startswith('replica')]
+        return [self.get_engine(app, bind=key) for key in keys]
+
+
+def _reads_from_replica(app):
+    return (
+        has_request_context()
+        and request.method in ('GET', 'HEAD')
+        and len(app.config.get('DATABASE_REPLICA_URIS', [])) > 0
+        and session.get('read_primary_until', 0) < time.time()
+    )
+
+
+# a connection is only used by the process that opened it: one inherited by a
+# forked worker is discarded at checkout and replaced with a new one
+@event.listens_for(Pool, 'connect')
+def _record_pid(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+
+
+@event.listens_for(Pool, 'checkout')
+def _check_pid(dbapi_connection, connection_record, connection_proxy):
+    if connection_record.info['pid'] != os.getpid():
+        connection_record.connection = connection_proxy.connection = None
+        raise exc.DisconnectionError('Connection belongs to another process')
@@ -0,0 +1,84 @@
+import json
+
+import click
+from sqlalchemy import event
+
+# indexes each route's queries are expected to use, see the
+# c4d81f0e5a92, 9d3b7e1f6a25, b6f0a3d8e417 and d2a6c8f4b190 migrations
+ROUTE_INDEXES = [
+    ('/', ['ix_venues_insert_date', 'ix_artists_insert_date']),
+    ('/venues', ['venue_stats_pkey']),
+    ('/venues/{venue_id}', ['ix_shows_venue_id_start_time']),
+    ('/artists', ['ix_artists_name_id']),
+    ('/artists/{artist_id}', ['ix_shows_artist_id_start_time']),
+    ('/shows', ['ix_shows_start_time_id']),
+    ('/artists/autocomplete?q=a', ['ix_artists_name_prefix']),
+    ('/venues/autocomplete?q=a', ['ix_venues_name_prefix']),
+    ('/venues/{venue_id}/free-slots?date=2020-01-01', ['ex_shows_venue_id_period']),
+    ('/artists/available?start_time=2020-01-01T21:00&state=CA&city=San Francisco',
+     ['ix_artists_state_city_lower', 'ex_shows_artist_id_period']),
+]
+
+
+def collect_queries(app, engine, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return response, statements
+
+
+def plan_indexes(engine, statement, parameters):
+    # sequential scans are disabled so the check does not depend on the
+    # planner preferring them on a small development database
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            connection.execute('SET LOCAL enable_seqscan = off')
+            plan = connection.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        finally:
+            transaction.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return set(_index_names(plan))
+
+
+def _index_names(node):
+    if isinstance(node, list):
+        for item in node:
+            yield from _index_names(item)
+    elif isinstance(node, dict):
+        if 'Index Name' in node:
+            yield node['Index Name']
+        for key in ('Plan', 'Plans'):
+            if key in node:
+                yield from _index_names(node[key])
+
+
+def check_route_indexes(app, engine):
+    ids = {
+        'venue_id': engine.execute('SELECT min(id) FROM venues').scalar(),
+        'artist_id': engine.execute('SELECT min(id) FROM artists').scalar()
+    }
+    failures = 0
+    for route, expected in ROUTE_INDEXES:
+        url = route.format(**ids)
+        response, statements = collect_queries(app, engine, url)
+        used = set()
+        for statement, parameters in statements:
+            used |= plan_indexes(engine, statement, parameters)
+        missing = [index for index in expected if index not in used]
+        if response.status_code != 200 or len(missing) > 0:
+            failures += 1
+            click.echo(f'FAIL {url} ({response.status_code}): missing {", ".join(missing) or "-"}, '
+                       f'used {", ".join(sorted(used)) or "-"}')
+        else:
+            click.echo(f'ok   {url}: {", ".join(sorted(used))}')
+    return failures
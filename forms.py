@@ -1,21 +1,34 @@
 from datetime import datetime, time
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, TimeField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Optional
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, TimeField, \
+    HiddenField
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Optional, NumberRange
 
 
 class ShowForm(Form):
-    artist_id = SelectField(
+    # the names are typeahead inputs that fill in the submitted ids
+    artist_id = HiddenField(
         'Artist', description='Artist', validators=[DataRequired()]
     )
-    venue_id = SelectField(
+    artist_name = StringField(
+        'Artist', description='Artist'
+    )
+    venue_id = HiddenField(
         'Venue', description='Venue', validators=[DataRequired()]
     )
+    venue_name = StringField(
+        'Venue', description='Venue'
+    )
     start_time = DateTimeField(
         'Start Time', description='Start Time',
         validators=[DataRequired()],
         default=datetime.today()
     )
+    duration = IntegerField(
+        'Duration', description='Duration (minutes)',
+        validators=[DataRequired(), NumberRange(min=1, max=24 * 60)],
+        default=120
+    )
 
 
 class VenueForm(Form):
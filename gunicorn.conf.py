@@ -0,0 +1,77 @@
+# Production gunicorn profile: gunicorn -c gunicorn.conf.py app:app
+import gc
+import glob
+import multiprocessing
+import os
+
+import config as settings
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+
+# the app is imported once in the master and forked into the workers, which
+# share its memory copy-on-write instead of each importing it again
+preload_app = True
+
+# threads serve requests concurrently while others wait on Postgres; psycopg2
+# releases the GIL during queries, so gthread needs no monkey patching (unlike
+# gevent, which would need psycogreen). Each worker needs a pooled connection
+# per thread, see DATABASE_POOL_SIZE.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# a thread holds at most one connection per database, so the default worker
+# count is capped to keep workers x threads within DATABASE_MAX_CONNECTIONS
+connections = min(threads, settings.SQLALCHEMY_ENGINE_OPTIONS['pool_size']
+                  + settings.SQLALCHEMY_ENGINE_OPTIONS['max_overflow'])
+workers = int(os.environ.get('WEB_CONCURRENCY', max(1, min(multiprocessing.cpu_count() * 2 + 1,
+                                                           settings.DATABASE_MAX_CONNECTIONS // connections))))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# recycled now and then to bound the growth of long-lived workers
+max_requests = 2000
+max_requests_jitter = 200
+
+
+def on_starting(server):
+    # the /metrics histograms of the previous server's workers are stale
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        os.remove(path)
+    # the workers link the bundles of this build; nothing has read the
+    # manifest yet, as no template has been rendered in the master
+    from assets import build_assets
+    build_assets(os.path.join(settings.basedir, 'static'), echo=server.log.info)
+
+
+def when_ready(server):
+    # the templates are compiled once here (or loaded from the bytecode cache)
+    # instead of on the first request in every worker
+    from app import app
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    # objects created during preload are moved out of the garbage collector's
+    # reach, so collections in the workers do not touch (and copy) their pages
+    gc.freeze()
+
+
+def worker_exit(server, worker):
+    # in the worker: its last histograms reach its file before it is merged
+    from app import request_metrics
+    request_metrics.flush(force=True)
+
+
+def child_exit(server, worker):
+    # in the master: the exited worker's histograms go into the aggregate file
+    from app import request_metrics
+    request_metrics.mark_process_dead(worker.pid)
+
+
+def pre_fork(server, worker):
+    # connections opened while preloading must not be shared with the
+    # workers; disposing them in the master is safe, in a worker it would
+    # close sockets the master still holds
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose()
+        for engine in db.get_replicas():
+            engine.dispose()
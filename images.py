@@ -0,0 +1,269 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+from flask import abort, request, send_file, url_for
+from PIL import Image, ImageOps, features
+
+from assets import IMMUTABLE
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 3
+# a cached file younger than this is not touched again when it is served
+TOUCH_INTERVAL = 3600
+
+
+class ImageError(Exception):
+    pass
+
+
+class ImageProxy:
+    """Resized copies of the venue and artist images, served from this host.
+
+    ``/img/<kind>/<id>/<size>`` fetches the ``image_link`` of the venue or
+    artist once, keeps the original and every thumbnail made from it in
+    ``IMAGE_CACHE_DIR``, and serves the thumbnails as WebP, or JPEG to clients
+    that do not accept WebP. The directory is bounded by ``IMAGE_CACHE_MAX_BYTES``
+    and evicts the least recently served files first. ``image_url()`` adds a
+    hash of the link to the URL, so a response to it never changes and is
+    cached as immutable; an edited link gets a new URL.
+    """
+
+    def __init__(self, app=None, loader=None):
+        self.loader = loader
+        self.webp = features.check('webp')
+        self._size = None
+        self._failures = {}
+        self._guard = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(64)]
+        if app is not None:
+            self.init_app(app, loader)
+
+    def init_app(self, app, loader):
+        # loader(kind, entity_id) returns the image link or None
+        self.loader = loader
+        self.directory = app.config.get('IMAGE_CACHE_DIR') or os.path.join(app.instance_path, 'images')
+        self.max_bytes = app.config.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+        self.sizes = app.config.get('IMAGE_SIZES', {'tile': 400, 'full': 1200})
+        self.quality = app.config.get('IMAGE_QUALITY', 80)
+        self.timeout = app.config.get('IMAGE_FETCH_TIMEOUT', 10)
+        self.max_source_bytes = app.config.get('IMAGE_MAX_SOURCE_BYTES', 20 * 1024 * 1024)
+        self.retry_interval = app.config.get('IMAGE_RETRY_INTERVAL', 60)
+        self.allow_private = app.config.get('IMAGE_ALLOW_PRIVATE_HOSTS', False)
+        app.add_url_rule('/img/<kind>/<int:entity_id>/<size>', 'image', self.send_image)
+        app.add_template_global(self.image_url)
+
+    def image_url(self, kind, entity_id, link, size='tile'):
+        if not link:
+            return link
+        return url_for('image', kind=kind, entity_id=entity_id, size=size, v=_digest(link)[:12])
+
+    def send_image(self, kind, entity_id, size):
+        if size not in self.sizes:
+            abort(404)
+        link = self.loader(kind, entity_id)
+        if not link:
+            abort(404)
+        digest = _digest(link)
+        format = 'webp' if self.webp and _accepts_webp() else 'jpeg'
+        try:
+            path = self.thumbnail(link, digest, size, format)
+        except ImageError:
+            abort(502)
+        response = send_file(path, mimetype=f'image/{format}', conditional=True)
+        # an outdated hash still gets the current image, but only briefly
+        if request.args.get('v') == digest[:12]:
+            response.headers['Cache-Control'] = IMMUTABLE
+        else:
+            response.headers['Cache-Control'] = 'public, max-age=300'
+        response.vary.add('Accept')
+        return response
+
+    def thumbnail(self, link, digest, size, format):
+        path = self._path(digest, f'{size}.{EXTENSIONS[format]}')
+        if self._hit(path):
+            return path
+        # one request per link makes its thumbnails, the others wait for them
+        with self._locks[int(digest[:8], 16) % len(self._locks)]:
+            if self._hit(path):
+                return path
+            # a link that cannot be fetched or read is not tried again for a while
+            failed_at = self._failures.get(digest)
+            if failed_at is not None and time.monotonic() - failed_at < self.retry_interval:
+                raise ImageError(f'{link} failed recently')
+            try:
+                content = resize(self._source(link, digest), self.sizes[size], format, self.quality)
+            except ImageError:
+                with self._guard:
+                    self._failures[digest] = time.monotonic()
+                raise
+            with self._guard:
+                self._failures.pop(digest, None)
+            self._write(path, content)
+        return path
+
+    def add_source(self, link, content):
+        # keeps content as the image behind link, as if it had been fetched
+        self._write(self._path(_digest(link), 'src'), content)
+
+    def _source(self, link, digest):
+        path = self._path(digest, 'src')
+        if self._hit(path):
+            with open(path, 'rb') as file:
+                return file.read()
+        source = fetch(link, self.timeout, self.max_source_bytes, self.allow_private)
+        self._write(path, source)
+        return source
+
+    def _path(self, digest, suffix):
+        return os.path.join(self.directory, digest[:2], f'{digest}.{suffix}')
+
+    @staticmethod
+    def _hit(path):
+        # the modification time orders the files for eviction
+        try:
+            modified = os.stat(path).st_mtime
+        except OSError:
+            return False
+        if time.time() - modified > TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except OSError:
+                return False
+        return True
+
+    def _write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(content)
+        os.replace(temporary, path)
+        with self._guard:
+            if self._size is not None:
+                self._size += len(content)
+            if self._size is None or self._size > self.max_bytes:
+                self._size = self._evict()
+
+    def _evict(self):
+        # the size is counted per process and recounted from the directory
+        # when it goes over the limit, which also catches the other workers'
+        # files; the oldest go until 90% of the limit is left
+        files = []
+        for entry in _scan(self.directory):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return total
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        return total
+
+
+def fetch(link, timeout, max_bytes, allow_private=False):
+    # the links are entered by users: every hop, redirects included, must
+    # resolve to public addresses, and the connection goes to the address
+    # that was checked rather than resolving the name again
+    for _ in range(MAX_REDIRECTS + 1):
+        url = urlsplit(link)
+        try:
+            port = url.port or (443 if url.scheme == 'https' else 80)
+        except ValueError as e:
+            raise ImageError(f'{link} is not a valid URL') from e
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise ImageError(f'{link} is not an http(s) URL')
+        address = resolve(url.hostname, port, allow_private)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(url.hostname, port, timeout=timeout)
+        connection._create_connection = \
+            lambda host_port, *args, **kwargs: socket.create_connection((address, port), *args, **kwargs)
+        try:
+            connection.request('GET', (url.path or '/') + (f'?{url.query}' if url.query else ''),
+                               headers={'User-Agent': 'fyyur'})
+            response = connection.getresponse()
+            if response.status in REDIRECTS and response.getheader('Location'):
+                link = urljoin(link, response.getheader('Location'))
+                continue
+            if response.status != 200:
+                raise ImageError(f'{link} answered {response.status}')
+            content = response.read(max_bytes + 1)
+        except (OSError, http.client.HTTPException) as e:
+            raise ImageError(f'{link} could not be fetched: {e}') from e
+        finally:
+            connection.close()
+        if len(content) > max_bytes:
+            raise ImageError(f'{link} is larger than {max_bytes} bytes')
+        return content
+    raise ImageError(f'{link} redirects more than {MAX_REDIRECTS} times')
+
+
+def resolve(host, port, allow_private=False):
+    # loopback, private, link-local (169.254.169.254) and reserved addresses
+    # are refused unless allow_private is set
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    except OSError as e:
+        raise ImageError(f'{host} could not be resolved: {e}') from e
+    if not allow_private:
+        for address in addresses:
+            if not ipaddress.ip_address(address.split('%')[0]).is_global:
+                raise ImageError(f'{host} resolves to the non-public address {address}')
+    return addresses[0]
+
+
+def resize(source, size, format, quality):
+    # fits the image in a size x size square, never enlarged
+    try:
+        with Image.open(io.BytesIO(source)) as image:
+            # JPEGs are decoded at the smallest scale still larger than the size
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size), Image.LANCZOS)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+            if format == 'jpeg' and image.mode == 'RGBA':
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            output = io.BytesIO()
+            if format == 'jpeg':
+                image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+            else:
+                image.save(output, 'WEBP', quality=quality, method=4)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError(f'Image could not be resized: {e}') from e
+    return output.getvalue()
+
+
+def _accepts_webp():
+    # only clients naming WebP can decode it; image/* and */* do not tell
+    return any(value == 'image/webp' and quality > 0 for value, quality in request.accept_mimetypes)
+
+
+def _digest(link):
+    return hashlib.sha256(link.encode('utf-8')).hexdigest()
+
+
+def _scan(directory):
+    try:
+        subdirectories = [entry for entry in os.scandir(directory) if entry.is_dir()]
+    except OSError:
+        return
+    for subdirectory in subdirectories:
+        for entry in os.scandir(subdirectory.path):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                yield entry
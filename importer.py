@@ -0,0 +1,191 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+# columns accepted in the import files, loaded as text into a temporary table
+# and cast by the INSERT ... SELECT
+COLUMNS = {
+    'venues': ['name', 'city', 'state', 'address', 'phone', 'genres', 'image_link', 'facebook_link', 'website',
+               'seeking_talent', 'seeking_description'],
+    'artists': ['name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link', 'website',
+                'seeking_venue', 'seeking_description', 'available_from', 'available_to'],
+    'shows': ['venue', 'venue_id', 'artist', 'artist_id', 'start_time', 'duration'],
+}
+
+ENTITY_UPSERT_SQL = {
+    'venues': """
+        INSERT INTO venues (name, city, state, address, phone, image_link, facebook_link, website,
+                            seeking_talent, seeking_description, insert_date)
+        SELECT DISTINCT ON (name)
+               name, city, state, address, phone, image_link, facebook_link, website,
+               coalesce(nullif(seeking_talent, '')::boolean, false), seeking_description, now()
+        FROM import_rows
+        ORDER BY name, line DESC
+        ON CONFLICT (name) DO UPDATE SET
+            city = excluded.city,
+            state = excluded.state,
+            address = excluded.address,
+            phone = excluded.phone,
+            image_link = excluded.image_link,
+            facebook_link = excluded.facebook_link,
+            website = excluded.website,
+            seeking_talent = excluded.seeking_talent,
+            seeking_description = excluded.seeking_description,
+            update_date = now(),
+            deleted_at = NULL
+    """,
+    'artists': """
+        INSERT INTO artists (name, city, state, phone, image_link, facebook_link, website,
+                             seeking_venue, seeking_description, available_from, available_to, insert_date)
+        SELECT DISTINCT ON (name)
+               name, city, state, phone, image_link, facebook_link, website,
+               coalesce(nullif(seeking_venue, '')::boolean, false), seeking_description,
+               coalesce(nullif(available_from, '')::time, '00:00'),
+               coalesce(nullif(available_to, '')::time, '23:59:59.999999'),
+               now()
+        FROM import_rows
+        ORDER BY name, line DESC
+        ON CONFLICT (name) DO UPDATE SET
+            city = excluded.city,
+            state = excluded.state,
+            phone = excluded.phone,
+            image_link = excluded.image_link,
+            facebook_link = excluded.facebook_link,
+            website = excluded.website,
+            seeking_venue = excluded.seeking_venue,
+            seeking_description = excluded.seeking_description,
+            available_from = excluded.available_from,
+            available_to = excluded.available_to,
+            update_date = now(),
+            deleted_at = NULL
+    """,
+}
+
+# replaces the genres of the imported venues/artists, creating missing genres
+GENRES_SQL = """
+    INSERT INTO genres (name)
+    SELECT DISTINCT trim(g.name)
+    FROM import_rows, unnest(string_to_array(import_rows.genres, ',')) AS g(name)
+    WHERE trim(g.name) <> ''
+    ON CONFLICT (name) DO NOTHING;
+
+    DELETE FROM {entity}_genres
+    USING {table}
+    WHERE {entity}_genres.{entity}_id = {table}.id
+      AND {table}.name IN (SELECT name FROM import_rows);
+
+    INSERT INTO {entity}_genres ({entity}_id, genre_id)
+    SELECT DISTINCT {table}.id, genres.id
+    FROM (SELECT DISTINCT ON (name) name, genres FROM import_rows ORDER BY name, line DESC) AS latest
+    JOIN {table} ON {table}.name = latest.name
+    CROSS JOIN LATERAL unnest(string_to_array(latest.genres, ',')) AS g(name)
+    JOIN genres ON genres.name = trim(g.name);
+"""
+
+# venue and artist names are resolved to ids for the whole batch in one join,
+# and every id (given or resolved) is joined again to the live rows, so rows
+# naming unknown or deleted venues or artists are left out rather than failing
+# the foreign keys; rows overlapping another show of their venue or artist
+# (the exclusion constraints) are skipped
+SHOWS_FROM_SQL = """
+    FROM import_rows
+    LEFT OUTER JOIN venues AS named_venues ON named_venues.name = import_rows.venue
+                                           AND nullif(import_rows.venue_id, '') IS NULL
+                                           AND named_venues.deleted_at IS NULL
+    LEFT OUTER JOIN artists AS named_artists ON named_artists.name = import_rows.artist
+                                             AND nullif(import_rows.artist_id, '') IS NULL
+                                             AND named_artists.deleted_at IS NULL
+    LEFT OUTER JOIN venues ON venues.id = coalesce(nullif(import_rows.venue_id, '')::integer, named_venues.id)
+                           AND venues.deleted_at IS NULL
+    LEFT OUTER JOIN artists ON artists.id = coalesce(nullif(import_rows.artist_id, '')::integer, named_artists.id)
+                            AND artists.deleted_at IS NULL
+"""
+
+SHOWS_UNKNOWN_SQL = """
+    SELECT count(*)
+""" + SHOWS_FROM_SQL + """
+    WHERE venues.id IS NULL OR artists.id IS NULL
+"""
+
+SHOWS_INSERT_SQL = """
+    INSERT INTO shows (venue_id, artist_id, start_time, duration)
+    SELECT venues.id,
+           artists.id,
+           import_rows.start_time::timestamp,
+           coalesce(nullif(import_rows.duration, '')::integer, 120)
+""" + SHOWS_FROM_SQL + """
+    WHERE venues.id IS NOT NULL AND artists.id IS NOT NULL
+    ON CONFLICT DO NOTHING
+"""
+
+
+def read_records(path):
+    # streams dicts from a .csv file (with a header row) or a JSON lines file
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batches(records, size):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(item) for item in value)
+    return str(value)
+
+
+def import_file(engine, kind, path, batch_size=5000, echo=print):
+    columns = COLUMNS[kind]
+    connection = engine.raw_connection()
+    started = time.monotonic()
+    total = 0
+    unknown = 0
+    overlapping = 0
+    try:
+        cursor = connection.cursor()
+        cursor.execute('DROP TABLE IF EXISTS import_rows')
+        cursor.execute('CREATE TEMP TABLE import_rows (line bigint, {}) ON COMMIT DELETE ROWS'.format(
+            ', '.join(f'{column} text' for column in columns)))
+        connection.commit()
+        for batch in batches(read_records(path), batch_size):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for line, record in enumerate(batch, start=total):
+                writer.writerow([line] + [_text(record.get(column)) for column in columns])
+            buffer.seek(0)
+            cursor.copy_expert('COPY import_rows (line, {}) FROM STDIN WITH (FORMAT csv)'.format(
+                ', '.join(columns)), buffer)
+            if kind == 'shows':
+                cursor.execute(SHOWS_UNKNOWN_SQL)
+                dropped = cursor.fetchone()[0]
+                cursor.execute(SHOWS_INSERT_SQL)
+                unknown += dropped
+                overlapping += len(batch) - dropped - cursor.rowcount
+            else:
+                cursor.execute(ENTITY_UPSERT_SQL[kind])
+                cursor.execute(GENRES_SQL.format(entity=kind[:-1], table=kind))
+            connection.commit()
+            total += len(batch)
+            elapsed = time.monotonic() - started
+            echo(f'{kind}: {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)')
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return total, unknown, overlapping
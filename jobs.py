@@ -0,0 +1,134 @@
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+
+class JobQueue:
+    """Background jobs kept in a database table and run by ``flask worker``.
+
+    ``enqueue`` adds the job to the current session, so it is committed with
+    the changes that call for it, or rolled back with them. Workers claim jobs
+    with ``FOR UPDATE SKIP LOCKED``, so any number of threads and processes can
+    share the table. A failed job is retried with exponential backoff until it
+    has run ``JOBS_MAX_ATTEMPTS`` times, then kept as failed with its error;
+    finished jobs are deleted. A job left running by a worker that died is
+    queued again after ``JOBS_TIMEOUT`` seconds, so jobs must be safe to run
+    twice. Two requests enqueueing a unique job at once may still queue it
+    twice.
+    """
+
+    def __init__(self, app=None, db=None, model=None, metrics=None):
+        self.handlers = {}
+        self.metrics = metrics
+        if app is not None:
+            self.init_app(app, db, model)
+
+    def init_app(self, app, db, model):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.max_attempts = app.config.get('JOBS_MAX_ATTEMPTS', 5)
+        self.retry_delay = app.config.get('JOBS_RETRY_DELAY', 10)
+        self.timeout = app.config.get('JOBS_TIMEOUT', 300)
+        self.poll_interval = app.config.get('JOBS_POLL_INTERVAL', 1.0)
+
+    def job(self, name):
+        def decorator(handler):
+            self.handlers[name] = handler
+            return handler
+        return decorator
+
+    def enqueue(self, name, unique=False, **payload):
+        # a unique job is not queued again while one is waiting: the waiting
+        # job covers whatever called for it until it runs
+        if name not in self.handlers:
+            raise KeyError(f'Unknown job {name}')
+        model = self.model
+        if unique and self.db.session.query(
+                model.query.filter(model.name == name, model.status == 'queued').exists()).scalar():
+            return
+        now = datetime.now()
+        self.db.session.add(self.model(name=name, payload=payload, status='queued', attempts=0,
+                                       max_attempts=self.max_attempts, run_at=now, created_at=now))
+
+    def run_worker(self, threads=2, stop=None, echo=print):
+        # runs until the stop event is set
+        stop = stop or threading.Event()
+        workers = [threading.Thread(target=self._work, args=(stop, echo), name=f'job-worker-{i}', daemon=True)
+                   for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(timeout=1.0)
+
+    def _work(self, stop, echo):
+        with self.app.app_context():
+            while not stop.is_set():
+                # a lost database connection leaves a claimed job running, to
+                # be queued again once it times out
+                try:
+                    job = self._claim()
+                    if job is None:
+                        self._requeue_stale()
+                    else:
+                        self._run(job, echo)
+                except Exception:
+                    self.db.session.rollback()
+                    echo(traceback.format_exc())
+                    job = None
+                if job is None:
+                    stop.wait(self.poll_interval)
+
+    def _claim(self):
+        model = self.model
+        now = datetime.now()
+        job = model.query \
+            .filter(model.status == 'queued', model.run_at <= now) \
+            .order_by(model.run_at, model.id) \
+            .with_for_update(skip_locked=True) \
+            .first()
+        if job is None:
+            self.db.session.rollback()
+            return None
+        job.status = 'running'
+        job.attempts += 1
+        job.started_at = now
+        self.db.session.commit()
+        return job
+
+    def _run(self, job, echo):
+        name, payload, job_id = job.name, job.payload, job.id
+        started = time.perf_counter()
+        try:
+            self.handlers[name](**payload)
+            self.db.session.commit()
+            outcome = 'done'
+        except Exception:
+            self.db.session.rollback()
+            error = traceback.format_exc()
+            echo(f'Job {job_id} ({name}) failed:\n{error}')
+            outcome = 'retry' if job.attempts < job.max_attempts else 'failed'
+        if outcome == 'done':
+            self.db.session.query(self.model).filter(self.model.id == job_id).delete(synchronize_session=False)
+        elif outcome == 'retry':
+            job.status = 'queued'
+            job.run_at = datetime.now() + timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+            job.last_error = error
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.now()
+            job.last_error = error
+        self.db.session.commit()
+        if self.metrics is not None:
+            self.metrics.observe('fyyur_job_duration_seconds', {'job': name, 'status': outcome},
+                                 time.perf_counter() - started)
+            self.metrics.flush()
+
+    def _requeue_stale(self):
+        model = self.model
+        self.db.session.query(model) \
+            .filter(model.status == 'running', model.started_at < datetime.now() - timedelta(seconds=self.timeout)) \
+            .update({'status': 'queued', 'run_at': datetime.now()}, synchronize_session=False)
+        self.db.session.commit()
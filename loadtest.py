@@ -0,0 +1,120 @@
+# Load test comparing the bare "gunicorn app:app" with the gunicorn.conf.py profile:
+#   python loadtest.py --compare
+# or against a running server:
+#   python loadtest.py --host 127.0.0.1 --port 8000
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import click
+
+from benchmark import percentile
+
+PATHS = ['/', '/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+SETUPS = [
+    ('bare', [sys.executable, '-m', 'gunicorn', '--config', os.devnull, '--bind', '127.0.0.1:{port}', 'app:app']),
+    ('tuned', [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', '127.0.0.1:{port}',
+               'app:app']),
+]
+
+
+def run_load(host, port, paths, concurrency, duration):
+    # every client thread requests the paths in turn over one keep-alive
+    # connection until the time is up
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        own = []
+        errors = 0
+        i = offset
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', paths[i % len(paths)])
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    errors += 1
+                own.append(time.perf_counter() - started)
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=30)
+            i += 1
+        connection.close()
+        with lock:
+            latencies.extend(own)
+            failures.append(errors)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else 0.0,
+        'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else 0.0,
+        'errors': sum(failures)
+    }
+
+
+def wait_for_port(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise click.ClickException(f'Server on port {port} did not start')
+
+
+def echo_result(name, result):
+    click.echo(f"{name:8} {result['rps']:9.1f} req/s  p50 {result['p50_ms']:8.2f}ms  "
+               f"p95 {result['p95_ms']:8.2f}ms  {result['requests']} requests, {result['errors']} errors")
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8000, show_default=True)
+@click.option('--path', 'paths', multiple=True, help='Paths to request, in turn.  [default: the main pages]')
+@click.option('--concurrency', default=32, show_default=True, help='Concurrent client connections.')
+@click.option('--duration', default=20, show_default=True, help='Seconds of load per run.')
+@click.option('--warmup', default=3, show_default=True, help='Seconds of load before measuring.')
+@click.option('--compare', is_flag=True, help='Start the bare and the tuned gunicorn setups in turn and load both.')
+def main(host, port, paths, concurrency, duration, warmup, compare):
+    """Measure throughput and latency of the main pages under concurrent load."""
+    paths = list(paths) or PATHS
+    if not compare:
+        run_load(host, port, paths, concurrency, warmup)
+        echo_result('server', run_load(host, port, paths, concurrency, duration))
+        return
+    results = []
+    for name, command in SETUPS:
+        server = subprocess.Popen([part.format(port=port) for part in command], stdout=subprocess.DEVNULL)
+        try:
+            wait_for_port('127.0.0.1', port)
+            run_load('127.0.0.1', port, paths, concurrency, warmup)
+            result = run_load('127.0.0.1', port, paths, concurrency, duration)
+            echo_result(name, result)
+            results.append(result)
+        finally:
+            server.terminate()
+            server.wait()
+    if results[0]['rps'] > 0:
+        click.echo(f"tuned/bare throughput: {results[1]['rps'] / results[0]['rps']:.2f}x")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
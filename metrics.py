@@ -0,0 +1,249 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# the histograms of the workers that exited
+AGGREGATE = 'aggregate.json'
+
+HISTOGRAMS = {
+    'fyyur_request_duration_seconds': ('Time spent handling the request.', DURATION_BUCKETS),
+    'fyyur_db_duration_seconds': ('Time spent executing SQL per request.', DURATION_BUCKETS),
+    'fyyur_template_duration_seconds': ('Time spent rendering templates per request.', DURATION_BUCKETS),
+    'fyyur_db_queries': ('SQL statements executed per request.', QUERY_BUCKETS),
+    'fyyur_job_duration_seconds': ('Time spent running background jobs, by outcome.', DURATION_BUCKETS),
+}
+
+
+class TimedTemplate(Template):
+    # adds the render time of every template, including the ones it extends or
+    # includes, to the current request
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            if has_request_context() and 'timing' in g:
+                g.timing['template'] += time.perf_counter() - started
+
+    def generate(self, *args, **kwargs):
+        # a streamed template renders while the response is sent; only the
+        # time spent producing each chunk counts, not waiting on the client
+        chunks = super().generate(*args, **kwargs)
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                if has_request_context() and 'timing' in g:
+                    g.timing['template'] += time.perf_counter() - started
+            yield chunk
+
+
+class RequestMetrics:
+    """Per-request SQL and template timing, exported as per-endpoint histograms.
+
+    Each request gets a ``Server-Timing`` header. The histograms are kept in
+    memory by every worker process and written to its own file in
+    ``METRICS_DIR`` at most every ``METRICS_FLUSH_INTERVAL`` seconds; ``/metrics``
+    merges the files of all workers, so any worker can answer the scrape.
+    The file of a worker that exited is merged into ``aggregate.json`` by
+    ``mark_process_dead()``. Clear the directory when the server is restarted.
+    """
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.flush_interval = 1.0
+        self._pid = None
+        self._data = {}
+        self._flushed_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'fyyur-metrics')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1.0)
+        os.makedirs(self.directory, exist_ok=True)
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            histogram = self._data.get(key)
+            if histogram is None:
+                histogram = self._data[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            histogram['buckets'][bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._flushed_at < self.flush_interval:
+            return
+        with self._lock:
+            self._check_pid()
+            self._flushed_at = now
+            entries = [[name, dict(labels), histogram] for (name, labels), histogram in self._data.items()]
+            path = self._path(self._pid)
+            with open(path + '.tmp', 'w') as file:
+                json.dump(entries, file)
+            os.replace(path + '.tmp', path)
+
+    def mark_process_dead(self, pid):
+        # called by the gunicorn master when a worker exits: its histograms are
+        # added to the aggregate file and its own file removed, so recycled
+        # workers do not leave a file each behind. Only the master writes the
+        # aggregate, one exit at a time.
+        path = self._path(pid)
+        try:
+            with open(path) as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+        aggregate = {}
+        aggregate_path = os.path.join(self.directory, AGGREGATE)
+        try:
+            with open(aggregate_path) as file:
+                for name, labels, histogram in json.load(file):
+                    aggregate[(name, tuple(sorted(labels.items())))] = histogram
+        except (OSError, ValueError):
+            pass
+        for name, labels, histogram in entries:
+            _add(aggregate, (name, tuple(sorted(labels.items()))), histogram)
+        with open(aggregate_path + '.tmp', 'w') as file:
+            json.dump([[name, dict(labels), histogram] for (name, labels), histogram in aggregate.items()], file)
+        os.replace(aggregate_path + '.tmp', aggregate_path)
+        os.remove(path)
+
+    def collect(self):
+        # merges the histograms written by every worker process
+        self.flush(force=True)
+        merged = {}
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as file:
+                    entries = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, histogram in entries:
+                if name not in HISTOGRAMS:
+                    continue
+                _add(merged, (name, tuple(sorted(labels.items()))), histogram)
+        return merged
+
+    def render(self):
+        # Prometheus text exposition format
+        merged = self.collect()
+        lines = []
+        for name, (description, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), histogram in sorted(merged.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], histogram['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {histogram["sum"]}')
+                lines.append(f'{name}_count{_labels(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def _start(self):
+        g.timing = {'started': time.perf_counter(), 'db': 0.0, 'queries': 0, 'template': 0.0}
+
+    def _finish(self, response):
+        if 'timing' not in g:
+            return response
+        timing = g.timing
+        total = time.perf_counter() - timing['started']
+        # the header of a streamed response only covers the work before the body
+        response.headers['Server-Timing'] = (
+            f'db;dur={timing["db"] * 1000:.2f};desc="{timing["queries"]} queries", '
+            f'tpl;dur={timing["template"] * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        labels = {'endpoint': request.endpoint or 'unmatched', 'method': request.method}
+        status = str(response.status_code)
+        if response.is_streamed:
+            # the body renders and queries while it is sent; the histograms
+            # get the request once the server has closed the response
+            response.call_on_close(lambda: self._observe_request(labels, status, timing))
+        else:
+            self._observe_request(labels, status, timing)
+        return response
+
+    def _observe_request(self, labels, status, timing):
+        total = time.perf_counter() - timing['started']
+        self.observe('fyyur_request_duration_seconds', dict(labels, status=status), total)
+        self.observe('fyyur_db_duration_seconds', labels, timing['db'])
+        self.observe('fyyur_template_duration_seconds', labels, timing['template'])
+        self.observe('fyyur_db_queries', labels, timing['queries'])
+        self.flush()
+
+    def _check_pid(self):
+        # a worker forked from a preloaded master starts with its own histograms,
+        # continuing from the file of a previous process with the same pid
+        pid = os.getpid()
+        if pid == self._pid:
+            return
+        self._pid = pid
+        self._data = {}
+        try:
+            with open(self._path(pid)) as file:
+                for name, labels, histogram in json.load(file):
+                    self._data[(name, tuple(sorted(labels.items())))] = histogram
+        except (OSError, ValueError):
+            pass
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+
+def _add(histograms, key, histogram):
+    total = histograms.setdefault(key, {'buckets': [0] * len(histogram['buckets']), 'sum': 0.0, 'count': 0})
+    total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+    total['sum'] += histogram['sum']
+    total['count'] += histogram['count']
+
+
+def _labels(labels):
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in labels) + '}'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if has_request_context() and 'timing' in g:
+        g.timing['db'] += time.perf_counter() - started
+        g.timing['queries'] += 1
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
@@ -0,0 +1,33 @@
+"""add full-text and trigram search indexes
+
+Revision ID: 3f1c9a7d2b64
+Revises: ea83a38303c2
+Create Date: 2026-10-18 10:12:41.208315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b64'
+down_revision = 'ea83a38303c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venues', 'artists'):
+        op.create_index(f'ix_{table}_name_tsv', table, [sa.text("to_tsvector('simple', name)")],
+                        postgresql_using='gin')
+        for column in ('name', 'city', 'state'):
+            op.create_index(f'ix_{table}_{column}_trgm', table, [column],
+                            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('venues', 'artists'):
+        for column in ('name', 'city', 'state'):
+            op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_name_tsv', table_name=table)
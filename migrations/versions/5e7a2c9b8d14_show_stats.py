@@ -0,0 +1,49 @@
+"""add materialized per-venue and per-artist show statistics
+
+Revision ID: 5e7a2c9b8d14
+Revises: c4d81f0e5a92
+Create Date: 2026-10-18 13:26:52.114087
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7a2c9b8d14'
+down_revision = 'c4d81f0e5a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for entity in ('venue', 'artist'):
+        op.create_table(f'{entity}_stats',
+        sa.Column(f'{entity}_id', sa.Integer(), nullable=False),
+        sa.Column('past_shows_count', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows_count', sa.Integer(), nullable=False),
+        sa.Column('next_show_time', sa.DateTime(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint([f'{entity}_id'], [f'{entity}s.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(f'{entity}_id')
+        )
+        op.create_index(op.f(f'ix_{entity}_stats_next_show_time'), f'{entity}_stats', ['next_show_time'],
+                        unique=False)
+        op.execute(f"""
+            INSERT INTO {entity}_stats ({entity}_id, past_shows_count, upcoming_shows_count, next_show_time,
+                                        refreshed_at)
+            SELECT {entity}s.id,
+                   count(shows.id) FILTER (WHERE shows.start_time <= now()),
+                   count(shows.id) FILTER (WHERE shows.start_time > now()),
+                   min(shows.start_time) FILTER (WHERE shows.start_time > now()),
+                   now()
+            FROM {entity}s
+            LEFT OUTER JOIN shows ON shows.{entity}_id = {entity}s.id
+            GROUP BY {entity}s.id
+        """)
+
+
+def downgrade():
+    for entity in ('artist', 'venue'):
+        op.drop_index(op.f(f'ix_{entity}_stats_next_show_time'), table_name=f'{entity}_stats')
+        op.drop_table(f'{entity}_stats')
@@ -0,0 +1,86 @@
+"""move genres to a normalized genres table
+
+Revision ID: 8b2e4d6a1c37
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-18 11:03:17.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d6a1c37'
+down_revision = '3f1c9a7d2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('genres',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('venue_genres',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venues.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_venue_genres_genre_id_venue_id', 'venue_genres', ['genre_id', 'venue_id'])
+    op.create_table('artist_genres',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artists.id'], ),
+    sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_artist_genres_genre_id_artist_id', 'artist_genres', ['genre_id', 'artist_id'])
+
+    # backfill from the comma-joined strings
+    op.execute("""
+        INSERT INTO genres (name)
+        SELECT DISTINCT trim(g.name)
+        FROM (
+            SELECT unnest(string_to_array(genres, ',')) AS name FROM venues
+            UNION ALL
+            SELECT unnest(string_to_array(genres, ',')) AS name FROM artists
+        ) AS g
+        WHERE trim(g.name) <> ''
+    """)
+    for table, key in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.execute(f"""
+            INSERT INTO {table[:-1]}_genres ({key}, genre_id)
+            SELECT DISTINCT t.id, genres.id
+            FROM {table} AS t
+            CROSS JOIN LATERAL unnest(string_to_array(t.genres, ',')) AS g(name)
+            JOIN genres ON genres.name = trim(g.name)
+        """)
+
+    op.drop_column('venues', 'genres')
+    op.drop_column('artists', 'genres')
+
+
+def downgrade():
+    op.add_column('artists', sa.Column('genres', sa.String(length=120), nullable=True))
+    op.add_column('venues', sa.Column('genres', sa.String(length=120), nullable=True))
+    for table, key in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.execute(f"""
+            UPDATE {table} AS t
+            SET genres = coalesce((
+                SELECT string_agg(genres.name, ',' ORDER BY genres.name)
+                FROM {table[:-1]}_genres AS tg
+                JOIN genres ON genres.id = tg.genre_id
+                WHERE tg.{key} = t.id
+            ), '')
+        """)
+        op.alter_column(table, 'genres', nullable=False)
+
+    op.drop_index('ix_artist_genres_genre_id_artist_id', table_name='artist_genres')
+    op.drop_table('artist_genres')
+    op.drop_index('ix_venue_genres_genre_id_venue_id', table_name='venue_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('genres')
@@ -0,0 +1,35 @@
+"""add lower(name) prefix indexes for the show form typeahead
+
+Revision ID: 9d3b7e1f6a25
+Revises: 5e7a2c9b8d14
+Create Date: 2026-10-18 14:02:37.118420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3b7e1f6a25'
+down_revision = '5e7a2c9b8d14'
+branch_labels = None
+depends_on = None
+
+# COLLATE "C" makes the btree usable for LIKE 'prefix%' and for ordering the
+# matches whatever the database collation is
+INDEXES = [
+    ('ix_venues_name_prefix', 'venues'),
+    ('ix_artists_name_prefix', 'artists'),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table in INDEXES:
+            op.create_index(name, table, [sa.text('(lower(name) COLLATE "C")')], postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
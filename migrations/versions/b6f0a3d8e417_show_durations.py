@@ -0,0 +1,52 @@
+"""add show durations and exclude overlapping shows per venue and artist
+
+Revision ID: b6f0a3d8e417
+Revises: 9d3b7e1f6a25
+Create Date: 2026-10-18 14:37:12.504316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f0a3d8e417'
+down_revision = '9d3b7e1f6a25'
+branch_labels = None
+depends_on = None
+
+PERIOD = "tsrange(start_time, start_time + interval '1 minute' * duration)"
+
+
+def upgrade():
+    # btree_gist provides the "=" operator class for the integer id columns
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('shows', sa.Column('duration', sa.Integer(), server_default='120', nullable=False))
+    # existing shows that would overlap are cut short at the start of the next
+    # show of their venue or artist (shows with the same start become empty)
+    op.execute("""
+        UPDATE shows
+        SET duration = least(
+            shows.duration,
+            coalesce(floor(extract(epoch FROM following.next_at_venue - shows.start_time) / 60), shows.duration),
+            coalesce(floor(extract(epoch FROM following.next_for_artist - shows.start_time) / 60), shows.duration)
+        )
+        FROM (
+            SELECT id,
+                   lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS next_at_venue,
+                   lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS next_for_artist
+            FROM shows
+        ) AS following
+        WHERE following.id = shows.id
+          AND (following.next_at_venue < shows.start_time + interval '1 minute' * shows.duration
+               OR following.next_for_artist < shows.start_time + interval '1 minute' * shows.duration)
+    """)
+    for column in ('venue_id', 'artist_id'):
+        op.execute(f'ALTER TABLE shows ADD CONSTRAINT ex_shows_{column}_period '
+                   f'EXCLUDE USING gist ({column} WITH =, {PERIOD} WITH &&)')
+
+
+def downgrade():
+    op.drop_constraint('ex_shows_artist_id_period', 'shows')
+    op.drop_constraint('ex_shows_venue_id_period', 'shows')
+    op.drop_column('shows', 'duration')
@@ -0,0 +1,40 @@
+"""add indexes for the shows, listing and recency access paths
+
+Revision ID: c4d81f0e5a92
+Revises: 8b2e4d6a1c37
+Create Date: 2026-10-18 12:41:05.730164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d81f0e5a92'
+down_revision = '8b2e4d6a1c37'
+branch_labels = None
+depends_on = None
+
+# built with CREATE INDEX CONCURRENTLY so the tables stay writable while the
+# migration runs online; that cannot happen inside a transaction
+INDEXES = [
+    ('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time']),
+    ('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time']),
+    ('ix_shows_start_time_id', 'shows', ['start_time', 'id']),
+    ('ix_venues_insert_date', 'venues', [sa.text('insert_date DESC')]),
+    ('ix_artists_insert_date', 'artists', [sa.text('insert_date DESC')]),
+    ('ix_venues_state_city', 'venues', ['state', 'city']),
+    ('ix_artists_name_id', 'artists', ['name', 'id']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
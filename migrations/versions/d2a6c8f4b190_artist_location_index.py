@@ -0,0 +1,27 @@
+"""add the artist location index for the available artists search
+
+Revision ID: d2a6c8f4b190
+Revises: b6f0a3d8e417
+Create Date: 2026-10-18 15:10:48.662093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6c8f4b190'
+down_revision = 'b6f0a3d8e417'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_artists_state_city_lower', 'artists', ['state', sa.text('lower(city)')],
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_artists_state_city_lower', table_name='artists', postgresql_concurrently=True)
@@ -0,0 +1,35 @@
+"""add soft delete flags to venues and artists
+
+Revision ID: e7c3f9a1b25d
+Revises: d2a6c8f4b190
+Create Date: 2026-10-18 16:42:05.318227
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3f9a1b25d'
+down_revision = 'd2a6c8f4b190'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # nullable columns without a default, added without rewriting the tables
+    op.add_column('venues', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('artists', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_venues_deleted_at', 'venues', ['deleted_at'],
+                        postgresql_where=sa.text('deleted_at IS NOT NULL'), postgresql_concurrently=True)
+        op.create_index('ix_artists_deleted_at', 'artists', ['deleted_at'],
+                        postgresql_where=sa.text('deleted_at IS NOT NULL'), postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_artists_deleted_at', table_name='artists', postgresql_concurrently=True)
+        op.drop_index('ix_venues_deleted_at', table_name='venues', postgresql_concurrently=True)
+    op.drop_column('artists', 'deleted_at')
+    op.drop_column('venues', 'deleted_at')
@@ -0,0 +1,44 @@
+"""add background jobs table
+
+Revision ID: f4a8d2c6e931
+Revises: e7c3f9a1b25d
+Create Date: 2026-10-18 18:05:47.602913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a8d2c6e931'
+down_revision = 'e7c3f9a1b25d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('jobs',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('name', sa.String(length=120), nullable=False),
+                    sa.Column('payload', sa.JSON(), nullable=False),
+                    sa.Column('status', sa.String(length=20), nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('max_attempts', sa.Integer(), nullable=False),
+                    sa.Column('run_at', sa.DateTime(), nullable=False),
+                    sa.Column('started_at', sa.DateTime(), nullable=True),
+                    sa.Column('finished_at', sa.DateTime(), nullable=True),
+                    sa.Column('last_error', sa.Text(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    # the workers only ever scan the queued and the running jobs
+    op.create_index('ix_jobs_queued_run_at', 'jobs', ['run_at', 'id'],
+                    postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ix_jobs_running_started_at', 'jobs', ['started_at'],
+                    postgresql_where=sa.text("status = 'running'"))
+
+
+def downgrade():
+    op.drop_index('ix_jobs_running_started_at', table_name='jobs')
+    op.drop_index('ix_jobs_queued_run_at', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,49 @@
+﻿--
+-- Genres of the seeded venues and artists, run after venues_seed.sql and artists_seed.sql
+--
+
+
+INSERT INTO "Fyyur".public.genres(name) VALUES
+(E'Classical');
+INSERT INTO "Fyyur".public.genres(name) VALUES
+(E'Folk');
+INSERT INTO "Fyyur".public.genres(name) VALUES
+(E'Hip-Hop');
+INSERT INTO "Fyyur".public.genres(name) VALUES
+(E'Jazz');
+INSERT INTO "Fyyur".public.genres(name) VALUES
+(E'R&B');
+INSERT INTO "Fyyur".public.genres(name) VALUES
+(E'Reggae');
+INSERT INTO "Fyyur".public.genres(name) VALUES
+(E'Rock n Roll');
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'The Musical Hop' AND genres.name = E'Classical';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'The Musical Hop' AND genres.name = E'Folk';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'The Musical Hop' AND genres.name = E'Jazz';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'The Musical Hop' AND genres.name = E'Reggae';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'The Dueling Pianos Bar' AND genres.name = E'Classical';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'The Dueling Pianos Bar' AND genres.name = E'Hip-Hop';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'The Dueling Pianos Bar' AND genres.name = E'R&B';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'Park Square Live Music & Coffe' AND genres.name = E'Classical';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'Park Square Live Music & Coffe' AND genres.name = E'Folk';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'Park Square Live Music & Coffe' AND genres.name = E'Jazz';
+INSERT INTO "Fyyur".public.venue_genres(venue_id, genre_id)
+SELECT venues.id, genres.id FROM "Fyyur".public.venues, "Fyyur".public.genres WHERE venues.name = E'Park Square Live Music & Coffe' AND genres.name = E'Rock n Roll';
+INSERT INTO "Fyyur".public.artist_genres(artist_id, genre_id)
+SELECT artists.id, genres.id FROM "Fyyur".public.artists, "Fyyur".public.genres WHERE artists.name = E'Guns N Petals' AND genres.name = E'Rock n Roll';
+INSERT INTO "Fyyur".public.artist_genres(artist_id, genre_id)
+SELECT artists.id, genres.id FROM "Fyyur".public.artists, "Fyyur".public.genres WHERE artists.name = E'Matt Quevedo' AND genres.name = E'Jazz';
+INSERT INTO "Fyyur".public.artist_genres(artist_id, genre_id)
+SELECT artists.id, genres.id FROM "Fyyur".public.artists, "Fyyur".public.genres WHERE artists.name = E'The Wild Sax Band' AND genres.name = E'Classical';
+INSERT INTO "Fyyur".public.artist_genres(artist_id, genre_id)
+SELECT artists.id, genres.id FROM "Fyyur".public.artists, "Fyyur".public.genres WHERE artists.name = E'The Wild Sax Band' AND genres.name = E'Jazz';
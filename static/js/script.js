@@ -2,3 +2,39 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// typeahead inputs: suggestions for the typed prefix come from the input's
+// data-autocomplete url, and picking one stores its id in the data-target field
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var target = document.getElementById(input.dataset.target);
+  var options = document.getElementById(input.getAttribute('list'));
+  var ids = {};
+  var timer = null;
+
+  input.addEventListener('input', function () {
+    target.value = ids[input.value] || '';
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      var prefix = input.value;
+      if (!prefix.trim() || target.value) {
+        return;
+      }
+      fetch(input.dataset.autocomplete + '?q=' + encodeURIComponent(prefix))
+        .then(function (response) { return response.json(); })
+        .then(function (matches) {
+          if (input.value !== prefix) {
+            return;
+          }
+          ids = {};
+          options.innerHTML = '';
+          matches.forEach(function (match) {
+            ids[match.name] = match.id;
+            var option = document.createElement('option');
+            option.value = match.name;
+            options.appendChild(option);
+          });
+          target.value = ids[input.value] || '';
+        });
+    }, 150);
+  });
+});
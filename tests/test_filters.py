@@ -0,0 +1,39 @@
+# python -m unittest discover tests
+import unittest
+from datetime import datetime, timezone
+
+import babel.dates
+
+from app import DATETIME_FORMATS, format_datetime, format_datetime_value
+
+START_TIME = datetime(2035, 4, 1, 20, 30)
+
+
+class FormatDatetimeTest(unittest.TestCase):
+    """The datetime filter against Babel formatting the same value."""
+
+    def setUp(self):
+        format_datetime_value.cache_clear()
+
+    def babel(self, format, value=START_TIME, locale='en_US'):
+        return babel.dates.format_datetime(value, DATETIME_FORMATS.get(format, format), locale=locale)
+
+    def test_formats_the_app_patterns(self):
+        for format in ('full', 'medium'):
+            self.assertEqual(format_datetime(START_TIME, format, 'en_US'), self.babel(format))
+
+    def test_formats_the_locale_formats(self):
+        for format in ('short', 'long'):
+            for locale in ('en_US', 'de_DE', 'ja_JP'):
+                self.assertEqual(format_datetime(START_TIME, format, locale), self.babel(format, locale=locale))
+
+    def test_formats_explicit_patterns(self):
+        self.assertEqual(format_datetime(START_TIME, 'yyyy-MM-dd HH:mm', 'en_US'), '2035-04-01 20:30')
+
+    def test_keeps_the_time_zone_of_aware_values(self):
+        value = START_TIME.replace(tzinfo=timezone.utc)
+        self.assertEqual(format_datetime(value, 'long', 'en_US'), self.babel('long', value))
+
+
+if __name__ == '__main__':
+    unittest.main()
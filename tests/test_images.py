@@ -0,0 +1,183 @@
+# python -m unittest discover tests
+import functools
+import http.server
+import io
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+
+from flask import Flask
+from PIL import Image, features
+
+import images
+from images import ImageProxy
+
+SAFARI_13 = 'image/png,image/svg+xml,image/*;q=0.8,*/*;q=0.5'
+
+
+def noise(width, height, seed):
+    # random pixels do not compress, so every image has a predictable size
+    rng = random.Random(seed)
+    return Image.frombytes('RGB', (width, height), bytes(rng.getrandbits(8) for _ in range(width * height * 3)))
+
+
+class StandInHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests[self.path] += 1
+        super().do_GET()
+
+
+class ImageProxyTest(unittest.TestCase):
+    """The proxy against a stand-in image host on a loopback port."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sources = tempfile.mkdtemp()
+        noise(1600, 1200, 0).save(os.path.join(cls.sources, 'photo.jpg'), quality=95)
+        for i in range(3):
+            noise(800, 600, i + 1).save(os.path.join(cls.sources, f'photo{i}.jpg'), quality=95)
+        with open(os.path.join(cls.sources, 'broken.jpg'), 'wb') as file:
+            file.write(b'not an image')
+        handler = functools.partial(StandInHandler, directory=cls.sources)
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        cls.server.requests = Counter()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.sources)
+
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+        self.server.requests.clear()
+        self.links = {}
+        self.app = Flask(__name__)
+        self.app.config.update(IMAGE_CACHE_DIR=self.cache, IMAGE_ALLOW_PRIVATE_HOSTS=True,
+                               IMAGE_SIZES={'tile': 400, 'full': 1200})
+        self.proxy = ImageProxy(self.app, lambda kind, entity_id: self.links.get((kind, entity_id)))
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache)
+
+    def get(self, entity_id, size='tile', accept='image/webp,*/*', **headers):
+        return self.read(f'/img/venue/{entity_id}/{size}', headers=dict(headers, Accept=accept))
+
+    def read(self, url, **kwargs):
+        # reads the body and closes the file it was sent from
+        response = self.client.get(url, **kwargs)
+        response.get_data()
+        response.close()
+        return response
+
+    def cached_files(self):
+        return {name for directory in os.listdir(self.cache)
+                for name in os.listdir(os.path.join(self.cache, directory))}
+
+    def test_fetches_a_link_once(self):
+        self.links['venue', 1] = self.base + '/photo.jpg'
+        for size, accept in [('tile', 'image/webp'), ('tile', 'image/webp'), ('tile', '*/*'), ('full', '*/*')]:
+            self.assertEqual(self.get(1, size, accept).status_code, 200)
+        self.assertEqual(self.server.requests['/photo.jpg'], 1)
+
+    def test_resizes_within_the_size(self):
+        self.links['venue', 1] = self.base + '/photo.jpg'
+        image = Image.open(io.BytesIO(self.get(1, 'tile', '*/*').data))
+        self.assertEqual(image.size, (400, 300))
+
+    @unittest.skipUnless(features.check('webp'), 'Pillow has no WebP support')
+    def test_serves_webp_only_to_clients_naming_it(self):
+        self.links['venue', 1] = self.base + '/photo.jpg'
+        for accept, mimetype in [('image/avif,image/webp,*/*', 'image/webp'), (SAFARI_13, 'image/jpeg'),
+                                 ('*/*', 'image/jpeg'), ('image/webp;q=0,*/*', 'image/jpeg')]:
+            response = self.get(1, accept=accept)
+            self.assertEqual(response.mimetype, mimetype, accept)
+            self.assertEqual(Image.open(io.BytesIO(response.data)).format, mimetype.split('/')[1].upper())
+            self.assertIn('Accept', response.headers['Vary'])
+
+    def test_caches_the_current_link_as_immutable(self):
+        self.links['venue', 1] = self.base + '/photo.jpg'
+        with self.app.test_request_context():
+            url = self.proxy.image_url('venue', 1, self.links['venue', 1])
+        self.assertIn('immutable', self.read(url).headers['Cache-Control'])
+        self.assertNotIn('immutable', self.get(1).headers['Cache-Control'])
+
+    def test_answers_304_to_if_none_match(self):
+        self.links['venue', 1] = self.base + '/photo.jpg'
+        etag = self.get(1).headers['ETag']
+        response = self.get(1, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_answers_404_to_unknown_sizes_and_entities(self):
+        self.links['venue', 1] = self.base + '/photo.jpg'
+        self.assertEqual(self.get(1, 'huge').status_code, 404)
+        self.assertEqual(self.get(2).status_code, 404)
+        self.assertEqual(self.server.requests['/photo.jpg'], 0)
+
+    def test_backs_off_from_undecodable_sources(self):
+        self.links['venue', 1] = self.base + '/broken.jpg'
+        resized = []
+        original = images.resize
+
+        def resize(*args):
+            resized.append(args)
+            return original(*args)
+
+        images.resize = resize
+        try:
+            self.assertEqual(self.get(1).status_code, 502)
+            self.assertEqual(self.get(1).status_code, 502)
+            self.assertEqual(len(resized), 1)
+            self.proxy.retry_interval = 0
+            self.assertEqual(self.get(1).status_code, 502)
+            self.assertEqual(len(resized), 2)
+        finally:
+            images.resize = original
+        self.assertEqual(self.server.requests['/broken.jpg'], 1)
+
+    def test_refuses_private_addresses_by_default(self):
+        self.proxy.allow_private = False
+        self.links['venue', 1] = self.base + '/photo.jpg'
+        self.assertEqual(self.get(1).status_code, 502)
+        self.assertEqual(self.server.requests['/photo.jpg'], 0)
+        with self.assertRaises(images.ImageError):
+            images.resolve('169.254.169.254', 80)
+
+    def test_evicts_the_least_recently_served_files(self):
+        for i in range(3):
+            self.links['venue', i] = f'{self.base}/photo{i}.jpg'
+        self.get(0, accept='*/*')
+        self.get(1, accept='*/*')
+        digests = [images._digest(self.links['venue', i]) for i in range(3)]
+        # venue 1 was served long ago, venue 0 two hours ago
+        now = time.time()
+        for name in self.cached_files():
+            path = os.path.join(self.cache, name[:2], name)
+            os.utime(path, (now, now - (10000 if name.startswith(digests[1]) else 7200)))
+        # serving venue 0 again makes its tile (not its source) recently served
+        self.get(0, accept='*/*')
+        self.proxy.max_bytes = sum(os.path.getsize(os.path.join(self.cache, name[:2], name))
+                                   for name in self.cached_files())
+        self.proxy._size = None
+        self.get(2, accept='*/*')
+        files = self.cached_files()
+        self.assertIn(f'{digests[0]}.tile.jpg', files)
+        self.assertIn(f'{digests[2]}.tile.jpg', files)
+        self.assertNotIn(f'{digests[0]}.src', files)
+        self.assertFalse(any(name.startswith(digests[1]) for name in files))
+
+
+if __name__ == '__main__':
+    unittest.main()